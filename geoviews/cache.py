@@ -0,0 +1,136 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from shapely.geometry import Polygon
+from shapely.geometry.base import BaseGeometry
+
+try:
+    # Vectorized geometry functions only available in shapely>=2
+    from shapely import get_num_coordinates
+except ImportError:
+    get_num_coordinates = None
+
+
+class LRUCache(object):
+    """
+    Thread-safe least-recently-used cache bounded by the number of
+    items and by the total number of bytes held by the cached values.
+    An optional reference may be stored alongside each value to keep
+    the object the key was derived from alive, ensuring that keys
+    based on object identity or memory addresses remain valid for
+    as long as the entry is cached.
+    """
+
+    def __init__(self, max_items=None, max_bytes=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            entry = self._data.pop(key)
+            self._data[key] = entry
+            return entry[0]
+
+    def set(self, key, value, ref=None):
+        nbytes = array_nbytes(value)
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data.pop(key)[1]
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                return
+            self._data[key] = (value, nbytes, ref)
+            self.nbytes += nbytes
+            self._evict()
+
+    def resize(self, max_items=None, max_bytes=None):
+        with self._lock:
+            self.max_items = max_items
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def _evict(self):
+        while self._data and (
+                (self.max_items is not None and len(self._data) > self.max_items) or
+                (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            _, (_, nbytes, _) = self._data.popitem(last=False)
+            self.nbytes -= nbytes
+
+
+def array_nbytes(value):
+    """
+    Returns the number of bytes held by the arrays in a value,
+    which may be an array, a shapely geometry or an arbitrarily
+    nested tuple, list or dict of arrays, or any other object
+    declaring its nbytes.
+    """
+    if isinstance(value, np.ndarray):
+        nbytes = value.nbytes
+        if np.ma.isMaskedArray(value) and value.mask is not np.ma.nomask:
+            nbytes += value.mask.nbytes
+        return nbytes
+    elif isinstance(value, (tuple, list)):
+        return sum(array_nbytes(v) for v in value)
+    elif isinstance(value, dict):
+        return sum(array_nbytes(v) for v in value.values())
+    elif isinstance(value, BaseGeometry):
+        return geom_nbytes(value)
+    return getattr(value, 'nbytes', 0)
+
+
+def geom_nbytes(geom):
+    """
+    Estimates the number of bytes held by a shapely geometry from
+    the number of coordinates it is made up of.
+    """
+    if get_num_coordinates is not None:
+        return int(get_num_coordinates(geom)) * 2 * 8
+    elif hasattr(geom, 'geoms'):
+        return sum(geom_nbytes(g) for g in geom.geoms)
+    elif isinstance(geom, Polygon):
+        return sum(len(ring.coords) for ring in
+                   [geom.exterior]+list(geom.interiors)) * 2 * 8
+    return len(geom.coords) * 2 * 8
+
+
+def data_key(data):
+    """
+    Returns a hashable key identifying the memory buffer of an
+    array or the identity of any other data object. The key does not
+    depend on the contents, so results cached against it go stale if
+    the data is modified in place.
+    """
+    if isinstance(data, np.ndarray):
+        iface = data.__array_interface__
+        return (iface['data'][0], iface['shape'], iface['strides'],
+                iface['typestr'])
+    return (type(data).__name__, id(data))
+
+
+def crs_key(crs):
+    """
+    Returns a hashable key identifying a cartopy coordinate
+    reference system. The limits and threshold of projections are
+    included since some projections, e.g. Mercator, define their
+    limits outside of the proj4 parameters.
+    """
+    limits = tuple(tuple(float(l) for l in getattr(crs, attr))
+                   for attr in ('x_limits', 'y_limits') if hasattr(crs, attr))
+    return (type(crs).__name__, crs.proj4_init, limits,
+            getattr(crs, 'threshold', None))
@@ -2,7 +2,8 @@ from holoviews.element import ElementConversion, Points as HvPoints
 
 from .geo import (_Element, Feature, Tiles, is_geographic,     # noqa (API import)
                   WMTS, Points, Image, Text, LineContours, RGB,
-                  FilledContours, Path, Polygons, Shape, Dataset)
+                  FilledContours, Path, Polygons, Shape, Shapes,
+                  Dataset)
 
 
 class GeoConversion(ElementConversion):
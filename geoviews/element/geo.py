@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 import param
 import numpy as np
 from cartopy import crs as ccrs
@@ -14,6 +16,9 @@ from shapely.geometry.base import BaseGeometry
 from shapely.geometry import (MultiLineString, LineString,
                               MultiPolygon, Polygon)
 
+from ..geometry import GeometryArray
+from ..readers import iter_shapefile, open_raster
+
 try:
     from iris.cube import Cube
 except ImportError:
@@ -219,6 +224,24 @@ class Image(_Element, HvImage):
 
     group = param.String(default='Image')
 
+    @classmethod
+    def from_file(cls, path, band=0, **kwargs):
+        """
+        Memory maps a raster stored in an NPY, flat binary or GeoTIFF
+        file without reading its data, see ``geoviews.readers.open_raster``
+        for the supported formats. The bounds and crs recorded for
+        the raster are used unless overridden, and the band selects
+        the channel of multi-band rasters.
+        """
+        array, bounds, crs = open_raster(path)
+        if array.ndim == 3:
+            array = array[..., band]
+        if bounds is not None:
+            kwargs.setdefault('bounds', bounds)
+        if crs is not None:
+            kwargs.setdefault('crs', crs)
+        return cls(array, **kwargs)
+
 
 class RGB(_Element, HvRGB):
     """
@@ -282,6 +305,18 @@ class Polygons(_Element, HvPolygons):
         return MultiPolygon(polys)
 
 
+def _shapefile_records(shapefile, kwargs):
+    """
+    Pops the bbox and predicate from the supplied keywords and returns
+    an iterator over the matching records in the shapefile.
+    """
+    bbox, predicate = kwargs.pop('bbox', None), kwargs.pop('predicate', None)
+    if bbox is None and predicate is None:
+        return Reader(shapefile).records()
+    return iter_shapefile(shapefile, bbox, predicate)
+
+
+
 class Shape(_Element):
     """
     Shape wraps any shapely geometry type.
@@ -308,10 +343,14 @@ class Shape(_Element):
         """
         Loads a shapefile from disk and optionally merges
         it with a dataset. See ``from_records`` for full
-        signature.
+        signature. A ``bbox`` of the form (x0, y0, x1, y1) in the
+        coordinates of the shapefile and a ``predicate`` accepting
+        the dictionary of attributes of each record may be supplied
+        to read only the matching records, without parsing the
+        geometries of the records which are rejected.
         """
-        reader = Reader(shapefile)
-        return cls.from_records(reader.records(), *args, **kwargs)
+        return cls.from_records(_shapefile_records(shapefile, kwargs),
+                                *args, **kwargs)
 
 
     @classmethod
@@ -374,15 +413,38 @@ class Shape(_Element):
                                  'in dataset: {}'.format(vdim))
             ddims = dataset.dimensions()
 
+            # Index the first row matching each combination of values
+            # of the dimensions being merged on
+            join = [(attr, dim) for attr, dim in on.items()
+                    if dataset.get_dimension(dim)]
+            if join:
+                lookup = {}
+                keys = zip(*[dataset.dimension_values(dim) for _, dim in join])
+                for row_idx, key in enumerate(keys):
+                    if key not in lookup:
+                        lookup[key] = row_idx
+            else:
+                lookup = {(): 0} if len(dataset) else {}
+            columns = {d.name: dataset.dimension_values(d)
+                       for d in [vdim]+[k for k in kdims if k in ddims]}
+
         data = []
         notfound = False
         for i, rec in enumerate(records):
             if dataset:
-                selection = {dim: rec.attributes.get(attr, None)
-                             for attr, dim in on.items()}
-                row = dataset.select(**selection)
-                if len(row):
-                    value = row[vdim.name][0]
+                key = tuple(rec.attributes.get(attr, None) for attr, _ in join)
+                if any(k is None for k in key):
+                    # Dataset.select does not constrain None values
+                    selection = {dim: rec.attributes.get(attr, None)
+                                 for attr, dim in on.items()}
+                    row = dataset.select(**selection)
+                    row = {d: row[d][0] for d in columns} if len(row) else {}
+                else:
+                    row_idx = lookup.get(key)
+                    row = {} if row_idx is None else {d: column[row_idx] for d, column
+                                                      in columns.items()}
+                if row:
+                    value = row[vdim.name]
                 elif drop_missing:
                     continue
                 else:
@@ -391,8 +453,8 @@ class Shape(_Element):
             if index:
                 key = []
                 for kdim in kdims:
-                    if kdim in ddims and len(row):
-                        k = row[kdim.name][0]
+                    if kdim in ddims and row:
+                        k = row[kdim.name]
                     elif kdim.name in rec.attributes:
                         k = rec.attributes[kdim.name]
                     else:
@@ -447,3 +509,185 @@ class Shape(_Element):
 
     def __len__(self):
         return len(self.data)
+
+
+
+class Shapes(_Element):
+    """
+    Shapes is a columnar collection of shapely geometries along with
+    any number of attribute columns holding one value per geometry.
+    The geometries are stored in a single GeometryArray, allowing
+    selection, projection and rendering to operate on all of them at
+    once, unlike an NdOverlay of Shape Elements.
+
+    The data may be supplied as a list of shapely geometries, a
+    GeometryArray, a dictionary of columns containing the geometries
+    in a 'geometry' column or a DataFrame with a 'geometry' column.
+    The attribute columns are used as value dimensions by default.
+    """
+
+    group = param.String(default='Shapes')
+
+    vdims = param.List(default=[], doc="""
+        The attribute columns associated with the geometries.""")
+
+    def __init__(self, data, **params):
+        if pd and isinstance(data, pd.DataFrame):
+            data = OrderedDict((c, data[c].values) for c in data.columns)
+        elif isinstance(data, GeometryArray) or (isinstance(data, list) and
+              all(isinstance(g, BaseGeometry) for g in data)):
+            data = OrderedDict([('geometry', data)])
+        if not isinstance(data, dict) or 'geometry' not in data:
+            raise TypeError('%s data has to be a list of shapely geometries, '
+                            'a GeometryArray or columns containing a '
+                            "'geometry' column." % type(self).__name__)
+
+        geometry = data['geometry']
+        if not isinstance(geometry, GeometryArray):
+            geometry = GeometryArray.from_geoms(geometry)
+        columns = OrderedDict([('geometry', geometry)])
+        for name, values in data.items():
+            if name == 'geometry':
+                continue
+            values = np.asarray(values)
+            if len(values) != len(geometry):
+                raise ValueError('Column %r has %d values but there are %d '
+                                 'geometries.' % (name, len(values), len(geometry)))
+            columns[name] = values
+        if 'vdims' not in params:
+            params['vdims'] = [c for c in columns if c != 'geometry']
+        super(Shapes, self).__init__(columns, **params)
+
+
+    @classmethod
+    def from_records(cls, records, **kwargs):
+        """
+        Loads a collection of ``cartopy.io.shapereader.Record``
+        objects into a Shapes Element with a column for each of the
+        record attributes.
+        """
+        geoms, attributes = [], OrderedDict()
+        for i, rec in enumerate(records):
+            geoms.append(rec.geometry)
+            for attr, value in rec.attributes.items():
+                if attr not in attributes:
+                    attributes[attr] = [None]*i
+                attributes[attr].append(value)
+            for values in attributes.values():
+                if len(values) == i:
+                    values.append(None)
+        data = OrderedDict([('geometry', geoms)])
+        data.update(attributes)
+        return cls(data, **kwargs)
+
+
+    @classmethod
+    def from_shapefile(cls, shapefile, **kwargs):
+        """
+        Loads a shapefile from disk into a Shapes Element, optionally
+        filtering the records by a ``bbox`` and ``predicate``, see
+        ``Shape.from_shapefile``.
+        """
+        return cls.from_records(_shapefile_records(shapefile, kwargs), **kwargs)
+
+
+    @property
+    def geometry(self):
+        """
+        The GeometryArray holding the geometries.
+        """
+        return self.data['geometry']
+
+
+    def take(self, indices):
+        """
+        Returns a Shapes Element containing the geometries and
+        attributes at the supplied indices.
+        """
+        indices = np.arange(len(self))[indices]
+        return self.clone(OrderedDict(
+            (k, v.take(indices) if k == 'geometry' else v[indices])
+            for k, v in self.data.items()))
+
+
+    def select(self, selection_specs=None, **selection):
+        """
+        Selects the geometries by the values of their attributes or
+        their bounds. Attribute selections may be a value, a list or
+        set of values, a (lower, upper) tuple selecting a half-open
+        range or a callable returning a boolean mask. Tuple ranges on
+        the key dimensions select the geometries whose bounds
+        intersect the range.
+        """
+        if selection_specs is not None and not any(self.matches(spec)
+                                                   for spec in selection_specs):
+            return self
+
+        mask = np.ones(len(self), dtype=bool)
+        for dim, sel in selection.items():
+            dim = self.get_dimension(dim)
+            if dim is None:
+                continue
+            elif dim in self.kdims:
+                if not isinstance(sel, tuple):
+                    raise ValueError('Key dimensions of %s may only be selected '
+                                     'by range.' % type(self).__name__)
+                idx = self.kdims.index(dim)
+                lower = -np.inf if sel[0] is None else sel[0]
+                upper = np.inf if sel[1] is None else sel[1]
+                bounds = self.geometry.bounds
+                with np.errstate(invalid='ignore'):
+                    mask &= (bounds[:, idx+2] >= lower) & (bounds[:, idx] <= upper)
+                continue
+
+            values = self.data[dim.name]
+            if isinstance(sel, tuple):
+                if sel[0] is not None:
+                    mask &= values >= sel[0]
+                if sel[1] is not None:
+                    mask &= values < sel[1]
+            elif isinstance(sel, (list, set)):
+                mask &= np.in1d(values, list(sel))
+            elif callable(sel):
+                mask &= np.asarray(sel(values), dtype=bool)
+            else:
+                mask &= values == sel
+        return self.take(np.flatnonzero(mask))
+
+
+    def dimension_values(self, dimension, expanded=True, flat=True):
+        """
+        Returns the values of an attribute column, the coordinates
+        of the geometries are not available as values.
+        """
+        dim = self.get_dimension(dimension, strict=True)
+        if dim in self.vdims:
+            return self.data[dim.name]
+        return np.array([])
+
+
+    def range(self, dimension, data_range=True):
+        dim = self.get_dimension(dimension, strict=True)
+        if dim.range != (None, None):
+            return dim.range
+        if dim in self.kdims:
+            idx = self.kdims.index(dim)
+            bounds = self.geometry.bounds
+            if not len(bounds) or np.isnan(bounds[:, idx]).all():
+                return (np.NaN, np.NaN)
+            return np.nanmin(bounds[:, idx]), np.nanmax(bounds[:, idx+2])
+        values = self.data[dim.name]
+        if not len(values) or values.dtype.kind not in 'biuf':
+            return (np.NaN, np.NaN)
+        return np.nanmin(values), np.nanmax(values)
+
+
+    def geom(self):
+        """
+        Returns a list of the shapely geometries.
+        """
+        return self.geometry.to_geoms()
+
+
+    def __len__(self):
+        return len(self.geometry)
@@ -0,0 +1,975 @@
+import os
+import copy
+import hashlib
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+from cartopy import crs as ccrs
+from cartopy.feature import Feature, NaturalEarthFeature
+from shapely.geometry import (MultiLineString, LineString, MultiPolygon,
+                              Polygon, Point, GeometryCollection, box)
+from shapely.geometry.base import BaseGeometry
+from shapely.strtree import STRtree
+
+try:
+    # Vectorized geometry functions only available in shapely>=2
+    from shapely import (get_coordinates, get_num_coordinates, get_parts,
+                         get_exterior_ring, get_rings, get_type_id)
+except ImportError:
+    get_coordinates = None
+
+from .cache import LRUCache, crs_key
+
+
+def project_coords(xs, ys, src_proj, dest_proj, chunk_size=1000000,
+                   threads=None):
+    """
+    Transforms arrays of x- and y-coordinates from the source to the
+    destination projection. Large arrays are split into chunks which
+    are transformed on a pool of threads, writing directly into
+    preallocated output arrays. Returns the projected xs and ys.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if len(xs) <= chunk_size:
+        projected = dest_proj.transform_points(src_proj, xs, ys)
+        return projected[:, 0], projected[:, 1]
+
+    proj_xs, proj_ys = np.empty(len(xs)), np.empty(len(ys))
+    def project_chunk(start):
+        chunk = slice(start, start+chunk_size)
+        projected = dest_proj.transform_points(src_proj, xs[chunk], ys[chunk])
+        proj_xs[chunk] = projected[:, 0]
+        proj_ys[chunk] = projected[:, 1]
+
+    pool = ThreadPool(threads)
+    try:
+        pool.map(project_chunk, range(0, len(xs), chunk_size))
+    finally:
+        pool.close()
+    return proj_xs, proj_ys
+
+
+def _coord_array(coords):
+    arr = np.asarray(coords, dtype=np.float64)
+    if not arr.size:
+        return np.empty((0, 2))
+    return arr.reshape(len(arr), -1)[:, :2]
+
+
+def geom_coords(geom, coords=None, interiors=True):
+    """
+    Returns a list of the Nx2 coordinate arrays of all the coordinate
+    sequences making up a shapely geometry, in the order expected by
+    rebuild_geom. Polygons contribute their exterior followed by
+    their interior rings (unless interiors is disabled), multi-part
+    geometries their parts in order.
+    """
+    if coords is None:
+        coords = []
+    if geom.is_empty:
+        return coords
+    gtype = geom.geom_type
+    if gtype == 'Polygon':
+        coords.append(_coord_array(geom.exterior.coords))
+        if interiors:
+            coords.extend(_coord_array(ring.coords) for ring in geom.interiors)
+    elif gtype in ('LineString', 'LinearRing', 'Point'):
+        coords.append(_coord_array(geom.coords))
+    else:
+        for part in geom.geoms:
+            geom_coords(part, coords, interiors)
+    return coords
+
+
+def rebuild_geom(geom, coords):
+    """
+    Rebuilds a geometry with the same structure as the supplied
+    geometry from an iterator of coordinate arrays, e.g. the
+    transformed coordinates returned by geom_coords.
+    """
+    if geom.is_empty:
+        return geom
+    gtype = geom.geom_type
+    if gtype == 'Polygon':
+        exterior = next(coords)
+        return Polygon(exterior, [next(coords) for _ in geom.interiors])
+    elif gtype == 'Point':
+        return Point(next(coords)[0])
+    elif gtype in ('LineString', 'LinearRing'):
+        return type(geom)(next(coords))
+    return type(geom)([rebuild_geom(part, coords) for part in geom.geoms])
+
+
+def _as_multi(geom):
+    """
+    Wraps single part geometries in the corresponding multi-part
+    type, matching the geometries returned by project_geometry.
+    """
+    if geom.geom_type == 'Polygon':
+        return MultiPolygon([geom] if not geom.is_empty else [])
+    elif geom.geom_type == 'LineString':
+        return MultiLineString([geom] if not geom.is_empty else [])
+    return geom
+
+
+def _lat_limits(proj):
+    """
+    Returns the range of latitudes covered by a cylindrical projection.
+    """
+    y0, y1 = proj.y_limits
+    lats = ccrs.Geodetic().transform_points(proj, np.zeros(2),
+                                            np.array([y0, y1]))[:, 1]
+    return lats.min(), lats.max()
+
+
+def _central_longitude(proj):
+    """
+    Returns the central longitude of a projection, which newer cartopy
+    versions declare as the prime meridian of PlateCarree.
+    """
+    params = proj.proj4_params
+    return params.get('lon_0', params.get('pm', 0))
+
+
+def needs_cutting(bounds, src_proj, dest_proj):
+    """
+    Given an Nx4 array of (x0, y0, x1, y1) bounds of geometries in
+    the source projection returns a boolean mask of the geometries
+    which may cross the boundary of the destination projection and
+    therefore require cartopy's full cutting and boundary attaching
+    logic. Geometries are only considered safe when projecting from
+    PlateCarree to a cylindrical projection, if they lie strictly
+    within the latitude limits of both projections and do not
+    straddle the longitude the destination projection is cut along.
+    """
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+    if not (isinstance(src_proj, ccrs.PlateCarree) and
+            isinstance(dest_proj, (ccrs.PlateCarree, ccrs.Mercator))):
+        return np.ones(len(bounds), dtype=bool)
+    eps = src_proj.threshold
+    src_lon0 = _central_longitude(src_proj)
+    dest_lon0 = _central_longitude(dest_proj)
+    # Longitude the destination is cut along, wrapped into [-180, 180)
+    x_cut = (dest_lon0 - src_lon0 + 360.) % 360. - 180.
+    (cx0, cx1), (cy0, cy1) = src_proj.x_limits, src_proj.y_limits
+    lat0, lat1 = _lat_limits(dest_proj)
+    x0, y0, x1, y1 = bounds.T
+    with np.errstate(invalid='ignore'):
+        safe = ((x0 > cx0+eps) & (x1 < cx1-eps) &
+                (y0 > max(cy0, lat0)+eps) & (y1 < min(cy1, lat1)-eps) &
+                ~((x0 <= x_cut) & (x_cut <= x1)))
+    return ~safe
+
+
+def project_geoms(geoms, src_proj, dest_proj):
+    """
+    Projects a list of shapely geometries from the source to the
+    destination projection. Geometries which provably do not cross
+    the boundary of the destination projection (see needs_cutting)
+    and contain no segments long enough to require resampling are
+    projected by transforming their coordinates with a single
+    vectorized transform_points call. Only the remaining geometries
+    are projected with cartopy's project_geometry, which cuts them
+    along the projection boundary.
+    """
+    geoms = list(geoms)
+    coords, ncoords = [], []
+    for geom in geoms:
+        n = len(coords)
+        geom_coords(geom, coords)
+        ncoords.append(len(coords)-n)
+    if not coords:
+        return geoms
+
+    # Compute bounds and longest segment of each geometry
+    buffer = np.concatenate(coords)
+    ring_lengths = np.array([len(c) for c in coords])
+    ring_ends = np.cumsum(ring_lengths)
+    ring_index = np.cumsum([0]+ncoords)
+    geom_lengths = np.array([ring_lengths[i:j].sum() for i, j
+                             in zip(ring_index[:-1], ring_index[1:])])
+    nonempty = geom_lengths > 0
+    starts = (np.cumsum(geom_lengths)-geom_lengths)[nonempty]
+    xs, ys = buffer[:, 0], buffer[:, 1]
+    bounds = np.column_stack([np.minimum.reduceat(xs, starts),
+                              np.minimum.reduceat(ys, starts),
+                              np.maximum.reduceat(xs, starts),
+                              np.maximum.reduceat(ys, starts)])
+    segments = np.zeros(len(buffer))
+    segments[:-1] = np.hypot(np.diff(xs), np.diff(ys))
+    segments[ring_ends-1] = 0
+    unsafe = np.zeros(len(geoms), dtype=bool)
+    unsafe[nonempty] = (needs_cutting(bounds, src_proj, dest_proj) |
+                        (np.maximum.reduceat(segments, starts) > src_proj.threshold))
+
+    # Transform coordinates of all safe geometries in one pass
+    safe_rows = np.repeat(~unsafe, geom_lengths)
+    projected = dest_proj.transform_points(src_proj, xs[safe_rows], ys[safe_rows])
+    safe_lengths = np.concatenate([ring_lengths[i:j] for i, j, u in
+                                   zip(ring_index[:-1], ring_index[1:], unsafe)
+                                   if not u] or [[]]).astype(int)
+    arrays = iter(np.split(projected[:, :2], np.cumsum(safe_lengths)[:-1]))
+
+    projected_geoms = []
+    for geom, cut in zip(geoms, unsafe):
+        if cut:
+            geom = dest_proj.project_geometry(geom, src_proj)
+        else:
+            geom = _as_multi(rebuild_geom(geom, arrays))
+        projected_geoms.append(geom)
+    return projected_geoms
+
+
+def project_geom(geom, src_proj, dest_proj):
+    """
+    Projects a shapely geometry from the source to the destination
+    projection. The parts of multi-part geometries are projected
+    individually, so only the parts crossing the boundary of the
+    destination projection are cut (see project_geoms).
+    """
+    if geom.geom_type not in ('MultiPolygon', 'MultiLineString'):
+        return project_geoms([geom], src_proj, dest_proj)[0]
+    parts = project_geoms(list(geom.geoms), src_proj, dest_proj)
+    return type(geom)([p for part in parts if not part.is_empty
+                       for p in part.geoms])
+
+
+def geom_buffers(geoms):
+    """
+    Extracts the paths making up a collection of geometries, i.e. the
+    exteriors of polygons and the coordinates of lines and points,
+    returning contiguous float64 xs and ys buffers along with an
+    array of offsets delimiting each path, such that path i spans
+    xs[offsets[i]:offsets[i+1]]. Multi-part geometries contribute
+    each of their parts.
+    """
+    if isinstance(geoms, BaseGeometry):
+        geoms = [geoms]
+    if get_coordinates is not None:
+        parts = np.empty(len(geoms), dtype=object)
+        parts[:] = list(geoms)
+        while len(parts) and (get_type_id(parts) >= 4).any():
+            parts = get_parts(parts)
+        polys = get_type_id(parts) == 3
+        parts[polys] = get_exterior_ring(parts[polys])
+        counts = get_num_coordinates(parts)
+        coords = get_coordinates(parts)
+    else:
+        paths = []
+        for geom in geoms:
+            geom_coords(geom, paths, interiors=False)
+        counts = np.array([len(p) for p in paths], dtype=np.int64)
+        coords = np.concatenate(paths) if paths else np.empty((0, 2))
+    offsets = np.zeros(len(counts)+1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    offsets = offsets[np.concatenate([[True], counts > 0])]
+    return (np.ascontiguousarray(coords[:, 0]),
+            np.ascontiguousarray(coords[:, 1]), offsets)
+
+
+def _iter_parts(geom):
+    """
+    Iterates over the single part geometries in a geometry.
+    """
+    if hasattr(geom, 'geoms'):
+        for part in geom.geoms:
+            for subpart in _iter_parts(part):
+                yield subpart
+    elif not geom.is_empty:
+        yield geom
+
+
+def ring_buffers(geoms, return_index=False):
+    """
+    Extracts all the rings of the polygons in a collection of
+    geometries, including their interiors, along with the coordinates
+    of any other parts. Returns contiguous xs and ys buffers, the
+    offsets delimiting each ring, the offsets into the rings
+    delimiting each single part geometry, whose first ring is the
+    exterior, and a mask of the parts which are polygons. If
+    return_index is enabled the index of the geometry each part
+    belongs to is also returned.
+    """
+    if isinstance(geoms, BaseGeometry):
+        geoms = [geoms]
+    if get_coordinates is not None:
+        parts = np.empty(len(geoms), dtype=object)
+        parts[:] = list(geoms)
+        index = np.arange(len(parts))
+        while len(parts) and (get_type_id(parts) >= 4).any():
+            parts, part_index = get_parts(parts, return_index=True)
+            index = index[part_index]
+        polys = get_type_id(parts) == 3
+        nrings = np.ones(len(parts), dtype=np.int64)
+        rings, ring_index = get_rings(parts[polys], return_index=True)
+        nrings[polys] = np.bincount(ring_index, minlength=polys.sum())
+        ring_polys = np.repeat(polys, nrings)
+        all_rings = np.empty(len(ring_polys), dtype=object)
+        all_rings[ring_polys] = rings
+        all_rings[~ring_polys] = parts[~polys]
+        counts = get_num_coordinates(all_rings)
+        coords = get_coordinates(all_rings)
+    else:
+        paths, nrings, polys, index = [], [], [], []
+        for i, geom in enumerate(geoms):
+            for part in _iter_parts(geom):
+                if part.geom_type == 'Polygon':
+                    rings = [part.exterior]+list(part.interiors)
+                else:
+                    rings = [part]
+                paths += [_coord_array(ring.coords) for ring in rings]
+                nrings.append(len(rings))
+                polys.append(part.geom_type == 'Polygon')
+                index.append(i)
+        counts = np.array([len(p) for p in paths], dtype=np.int64)
+        coords = np.concatenate(paths) if paths else np.empty((0, 2))
+        nrings = np.array(nrings, dtype=np.int64)
+        polys = np.array(polys, dtype=bool)
+        index = np.array(index, dtype=np.int64)
+    ring_offsets = np.zeros(len(counts)+1, dtype=np.int64)
+    np.cumsum(counts, out=ring_offsets[1:])
+    part_offsets = np.zeros(len(nrings)+1, dtype=np.int64)
+    np.cumsum(nrings, out=part_offsets[1:])
+    buffers = (np.ascontiguousarray(coords[:, 0]),
+               np.ascontiguousarray(coords[:, 1]),
+               ring_offsets, part_offsets, polys)
+    return buffers + (index,) if return_index else buffers
+
+
+def _signed_areas(xs, ys, offsets):
+    """
+    Computes the signed areas of the closed rings in flat coordinate
+    buffers, which are positive for counter-clockwise rings.
+    """
+    cross = np.zeros(len(xs))
+    cross[:-1] = xs[:-1]*ys[1:] - xs[1:]*ys[:-1]
+    csum = np.concatenate([[0], np.cumsum(cross)])
+    starts, ends = offsets[:-1], np.maximum(offsets[1:]-1, offsets[:-1])
+    return (csum[ends] - csum[starts])/2.
+
+
+def _ring_types(ring_offsets, part_offsets, polys):
+    """
+    Returns masks of the exterior and interior rings of polygons.
+    """
+    nrings = np.diff(part_offsets)
+    ring_polys = np.repeat(polys, nrings)
+    first = np.zeros(len(ring_polys), dtype=bool)
+    first[part_offsets[:-1][nrings > 0]] = True
+    return ring_polys & first, ring_polys & ~first
+
+
+def _orient_index(xs, ys, ring_offsets, part_offsets, polys):
+    """
+    Returns an index into the coordinates of the rings returned by
+    ring_buffers which orients polygon exteriors counter-clockwise
+    and their interior rings clockwise.
+    """
+    exteriors, holes = _ring_types(ring_offsets, part_offsets, polys)
+    areas = _signed_areas(xs, ys, ring_offsets)
+    flip = (exteriors & (areas < 0)) | (holes & (areas > 0))
+    index = np.arange(len(xs))
+    if flip.any():
+        lengths = np.diff(ring_offsets)
+        ring_ids = np.repeat(np.arange(len(lengths)), lengths)
+        flipped = flip[ring_ids]
+        ids = ring_ids[flipped]
+        index[flipped] = (ring_offsets[ids] + ring_offsets[ids+1] - 1 -
+                          index[flipped])
+    return index
+
+
+def orient_rings(xs, ys, ring_offsets, part_offsets, polys):
+    """
+    Orients the rings returned by ring_buffers such that polygon
+    exteriors are counter-clockwise and their interior rings
+    clockwise, so that the interiors are left empty when filled
+    using the nonzero winding rule. Returns the reordered xs and ys.
+    """
+    index = _orient_index(xs, ys, ring_offsets, part_offsets, polys)
+    return xs[index], ys[index]
+
+
+def hole_paths(xs, ys, ring_offsets, part_offsets, polys):
+    """
+    Converts the rings returned by ring_buffers into a single path
+    per part, which may be drawn as one patch. The rings are
+    oriented (see orient_rings) and each interior ring is appended
+    to the exterior, returning to the start of the exterior
+    afterwards. When filled using the nonzero winding rule the
+    interior rings are therefore left empty. Returns the flat xs
+    and ys of the paths along with the offsets delimiting each path.
+    """
+    index = _orient_index(xs, ys, ring_offsets, part_offsets, polys)
+    _, holes = _ring_types(ring_offsets, part_offsets, polys)
+
+    # Return to the start of the exterior after each hole
+    nrings = np.diff(part_offsets)
+    ring_parts = np.repeat(np.arange(len(nrings)), nrings)
+    ext_starts = ring_offsets[part_offsets[:-1]]
+    returns = index[ext_starts[ring_parts[holes]]]
+    index = np.insert(index, ring_offsets[1:][holes], returns)
+    nholes = np.bincount(ring_parts[holes], minlength=len(nrings))
+    offsets = ring_offsets[part_offsets] + np.concatenate([[0], np.cumsum(nholes)])
+    return xs[index], ys[index], offsets
+
+
+def nan_separated(xs, ys, offsets):
+    """
+    Joins the paths in flat coordinate buffers into single arrays
+    with the paths separated by NaNs, as accepted by the bokeh
+    multi_line and patches glyphs.
+    """
+    split = offsets[1:-1]
+    return np.insert(xs, split, np.NaN), np.insert(ys, split, np.NaN)
+
+
+def _ranges(starts, ends):
+    """
+    Concatenates the integer ranges between the supplied starts
+    and ends into a single index array.
+    """
+    lengths = ends - starts
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return np.arange(lengths.sum()) + offsets
+
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths)+1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+class GeometryArray(object):
+    """
+    Columnar store for a collection of shapely geometries. The
+    coordinates of all geometries are held in contiguous xs and ys
+    buffers, delimited into rings, single part geometries and
+    geometries by nested offset arrays (see ring_buffers), so that
+    selecting, projecting and rendering the geometries may operate
+    on all of them at once rather than on individual shapely
+    objects.
+    """
+
+    def __init__(self, xs, ys, ring_offsets, part_offsets, geom_offsets, polys):
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+        self.ring_offsets = np.asarray(ring_offsets, dtype=np.int64)
+        self.part_offsets = np.asarray(part_offsets, dtype=np.int64)
+        self.geom_offsets = np.asarray(geom_offsets, dtype=np.int64)
+        self.polys = np.asarray(polys, dtype=bool)
+        self._bounds = None
+        self._projected = {}
+
+    @classmethod
+    def from_geoms(cls, geoms):
+        """
+        Builds a GeometryArray from a list of shapely geometries.
+        """
+        geoms = list(geoms)
+        xs, ys, ring_offsets, part_offsets, polys, index = ring_buffers(
+            geoms, return_index=True)
+        geom_offsets = _offsets(np.bincount(index, minlength=len(geoms)))
+        return cls(xs, ys, ring_offsets, part_offsets, geom_offsets, polys)
+
+    @classmethod
+    def concatenate(cls, arrays):
+        """
+        Concatenates a list of GeometryArrays.
+        """
+        arrays = list(arrays)
+        if not arrays:
+            return cls.from_geoms([])
+        ring_lengths = [np.diff(a.ring_offsets) for a in arrays]
+        nrings = [np.diff(a.part_offsets) for a in arrays]
+        nparts = [np.diff(a.geom_offsets) for a in arrays]
+        return cls(np.concatenate([a.xs for a in arrays]),
+                   np.concatenate([a.ys for a in arrays]),
+                   _offsets(np.concatenate(ring_lengths)),
+                   _offsets(np.concatenate(nrings)),
+                   _offsets(np.concatenate(nparts)),
+                   np.concatenate([a.polys for a in arrays]))
+
+    def __len__(self):
+        return len(self.geom_offsets)-1
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.xs, self.ys, self.ring_offsets,
+                                      self.part_offsets, self.geom_offsets,
+                                      self.polys))
+
+    @property
+    def _coord_offsets(self):
+        """
+        Offsets delimiting the coordinates of each geometry.
+        """
+        return self.ring_offsets[self.part_offsets[self.geom_offsets]]
+
+    @property
+    def bounds(self):
+        """
+        Nx4 array of the (x0, y0, x1, y1) bounds of each geometry,
+        which are NaN for empty geometries.
+        """
+        if self._bounds is None:
+            self._bounds = path_bounds(self.xs, self.ys,
+                                       np.diff(self._coord_offsets))
+        return self._bounds
+
+    def take(self, indices):
+        """
+        Returns a GeometryArray of the geometries at the supplied
+        indices.
+        """
+        indices = np.arange(len(self))[indices]
+        parts = _ranges(self.geom_offsets[indices], self.geom_offsets[indices+1])
+        rings = _ranges(self.part_offsets[parts], self.part_offsets[parts+1])
+        coords = _ranges(self.ring_offsets[rings], self.ring_offsets[rings+1])
+        return type(self)(self.xs[coords], self.ys[coords],
+                          _offsets(np.diff(self.ring_offsets)[rings]),
+                          _offsets(np.diff(self.part_offsets)[parts]),
+                          _offsets(np.diff(self.geom_offsets)[indices]),
+                          self.polys[parts])
+
+    def geom(self, index):
+        """
+        Returns the geometry at the supplied index as a shapely
+        geometry, multi-part geometries being returned as the
+        corresponding multi-part type.
+        """
+        parts = []
+        for part in range(self.geom_offsets[index], self.geom_offsets[index+1]):
+            r0, r1 = self.part_offsets[part], self.part_offsets[part+1]
+            rings = [np.column_stack([self.xs[s:e], self.ys[s:e]]) for s, e in
+                     zip(self.ring_offsets[r0:r1], self.ring_offsets[r0+1:r1+1])]
+            if not rings:
+                continue
+            elif self.polys[part]:
+                parts.append(Polygon(rings[0], rings[1:]))
+            elif len(rings[0]) == 1:
+                parts.append(Point(rings[0][0]))
+            else:
+                parts.append(LineString(rings[0]))
+        if len(parts) == 1:
+            return parts[0]
+        elif not parts:
+            return Polygon()
+        elif all(p.geom_type == 'Polygon' for p in parts):
+            return MultiPolygon(parts)
+        elif all(p.geom_type == 'LineString' for p in parts):
+            return MultiLineString(parts)
+        return GeometryCollection(parts)
+
+    def to_geoms(self):
+        """
+        Returns a list of the shapely geometries in the array.
+        """
+        return [self.geom(i) for i in range(len(self))]
+
+    def paths(self):
+        """
+        Returns the flat xs and ys of a single path per part suitable
+        for drawing as patches (see hole_paths), the offsets
+        delimiting each path and the index of the geometry each
+        path belongs to.
+        """
+        xs, ys, offsets = hole_paths(self.xs, self.ys, self.ring_offsets,
+                                     self.part_offsets, self.polys)
+        index = np.repeat(np.arange(len(self)), np.diff(self.geom_offsets))
+        nonempty = np.diff(offsets) > 0
+        return xs, ys, offsets[np.concatenate([[True], nonempty])], index[nonempty]
+
+    def project(self, src_proj, dest_proj):
+        """
+        Projects the geometries from the source to the destination
+        projection. The coordinates of all geometries which provably
+        do not require cutting along the projection boundary (see
+        project_geoms) are transformed in a single pass, the rest are
+        projected with cartopy's project_geometry. The result is
+        cached on the array.
+        """
+        key = (crs_key(src_proj), crs_key(dest_proj))
+        if key in self._projected:
+            return self._projected[key]
+
+        offsets = self._coord_offsets
+        nonempty = np.diff(offsets) > 0
+        segments = np.zeros(len(self.xs))
+        segments[:-1] = np.hypot(np.diff(self.xs), np.diff(self.ys))
+        segments[self.ring_offsets[1:]-1] = 0
+        unsafe = np.zeros(len(self), dtype=bool)
+        if nonempty.any():
+            starts = offsets[:-1][nonempty]
+            unsafe[nonempty] = (needs_cutting(self.bounds[nonempty], src_proj, dest_proj) |
+                                (np.maximum.reduceat(segments, starts) > src_proj.threshold))
+
+        safe = self.take(np.flatnonzero(~unsafe))
+        xs, ys = project_coords(safe.xs, safe.ys, src_proj, dest_proj)
+        safe = type(self)(xs, ys, safe.ring_offsets, safe.part_offsets,
+                          safe.geom_offsets, safe.polys)
+        if unsafe.any():
+            cut = [dest_proj.project_geometry(self.geom(i), src_proj)
+                   for i in np.flatnonzero(unsafe)]
+            order = np.argsort(np.concatenate([np.flatnonzero(~unsafe),
+                                               np.flatnonzero(unsafe)]),
+                               kind='mergesort')
+            projected = self.concatenate([safe, self.from_geoms(cut)]).take(order)
+        else:
+            projected = safe
+        self._projected[key] = projected
+        return projected
+
+
+_feature_cache = LRUCache(max_bytes=512*1024**2)
+
+
+def _feature_key(feature, scale, src_proj, dest_proj):
+    """
+    Returns a key identifying the geometries of a Natural Earth
+    feature at the supplied scale projected from the source to the
+    destination projection or None for other feature types.
+    """
+    if not isinstance(feature, NaturalEarthFeature):
+        return None
+    return ('NaturalEarthFeature', feature.category, feature.name,
+            scale, crs_key(src_proj), crs_key(dest_proj))
+
+
+def feature_arrays(feature, scale, src_proj, dest_proj, cache_dir=None):
+    """
+    Returns the geometries of a cartopy Feature at the supplied scale
+    projected to the destination projection as a dictionary with
+    flat xs and ys coordinate buffers, the lengths of each path and
+    whether the geometries are lines. The arrays are cached per
+    feature, scale and pair of projections for the lifetime of the
+    process and are therefore returned read-only. If a cache_dir is
+    supplied, arrays for Natural Earth features are also persisted
+    to disk so new processes start warm.
+    """
+    key = _feature_key(feature, scale, src_proj, dest_proj)
+    if key is None:
+        key = (type(feature).__name__, id(feature), scale,
+               crs_key(src_proj), crs_key(dest_proj))
+        cache_dir = None
+    arrays = _feature_cache.get(key)
+    if arrays is not None:
+        return dict(arrays)
+
+    path = None
+    if cache_dir:
+        fname = hashlib.md5(repr(key).encode('utf-8')).hexdigest()
+        path = os.path.join(cache_dir, 'feature_%s.npz' % fname)
+        if os.path.isfile(path):
+            with np.load(path) as f:
+                arrays = {k: f[k] for k in ('xs', 'ys', 'lengths')}
+                arrays['lines'] = bool(f['lines'])
+
+    if arrays is None:
+        scaled = copy.copy(feature)
+        scaled.scale = scale
+        geoms = list(scaled.geometries())
+        lines = bool(geoms) and isinstance(geoms[0], (LineString, MultiLineString))
+        geoms = project_geoms(geoms, src_proj, dest_proj)
+        if lines:
+            xs, ys, offsets = geom_buffers(geoms)
+        else:
+            xs, ys, offsets = hole_paths(*ring_buffers(geoms))
+        arrays = dict(xs=xs, ys=ys, lengths=np.diff(offsets), lines=lines)
+        if path:
+            _save_arrays(path, arrays)
+    for name in ('xs', 'ys', 'lengths'):
+        arrays[name].setflags(write=False)
+    _feature_cache.set(key, arrays, ref=feature)
+    return dict(arrays)
+
+
+def _save_arrays(path, arrays):
+    """
+    Atomically saves a dictionary of arrays to an npz file,
+    ignoring any errors writing to the cache directory.
+    """
+    try:
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        fd, tmp = tempfile.mkstemp(suffix='.npz', dir=dirname)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        pass
+
+
+def feature_scale(extent, crs, scales=(('110m', 0.5), ('50m', 0.1))):
+    """
+    Selects the Natural Earth scale appropriate for displaying the
+    (x0, y0, x1, y1) extent in the supplied projection. The extent is
+    compared to the size of the projection domain and the coarsest
+    scale whose minimum fraction of the domain is covered is chosen,
+    falling back to the 10m scale for small extents.
+    """
+    if extent is None or not all(e is not None and np.isfinite(e) for e in extent):
+        return scales[0][0]
+    x0, y0, x1, y1 = extent
+    (dx0, dx1), (dy0, dy1) = crs.x_limits, crs.y_limits
+    fraction = max(abs(x1-x0)/(dx1-dx0), abs(y1-y0)/(dy1-dy0))
+    for scale, min_fraction in scales:
+        if fraction >= min_fraction:
+            return scale
+    return '10m'
+
+
+class AutoScaleFeature(Feature):
+    """
+    Proxy for a NaturalEarthFeature which selects the scale of the
+    geometries based on the extent they are requested for, allowing
+    matplotlib to draw the appropriate level of detail when zooming.
+    """
+
+    def __init__(self, feature):
+        super(AutoScaleFeature, self).__init__(feature.crs, **feature.kwargs)
+        self.feature = feature
+        self._features = {}
+
+    def scaled(self, scale):
+        """
+        Returns a copy of the wrapped feature at the supplied scale.
+        """
+        if scale not in self._features:
+            feature = copy.copy(self.feature)
+            feature.scale = scale
+            self._features[scale] = feature
+        return self._features[scale]
+
+    def geometries(self):
+        return self.scaled(feature_scale(None, self.crs)).geometries()
+
+    def intersecting_geometries(self, extent):
+        if extent is None:
+            scale = feature_scale(None, self.crs)
+        else:
+            x0, x1, y0, y1 = extent
+            scale = feature_scale((x0, y0, x1, y1), self.crs)
+        return self.scaled(scale).intersecting_geometries(extent)
+
+
+_lod_cache = LRUCache(max_bytes=256*1024**2)
+
+
+def simplify_level(pixel_size):
+    """
+    Returns the level of the simplification pyramid for the supplied
+    pixel size, i.e. the largest power of two tolerance which does
+    not exceed it, or None if the pixel size is not valid.
+    """
+    if pixel_size is None or not np.isfinite(pixel_size) or pixel_size <= 0:
+        return None
+    return int(np.floor(np.log2(pixel_size)))
+
+
+def lod_geom(key, geom_fn, level=None, ref=None):
+    """
+    Returns the geometry computed by geom_fn simplified with a
+    tolerance of 2**level while preserving topology. The geometry
+    and each level of the simplification pyramid are cached under
+    the supplied key, so each level is only computed once. A level
+    of None returns the unsimplified geometry. The optional ref
+    keeps the object the key was derived from alive while cached.
+    """
+    geom = _lod_cache.get((key, None))
+    if geom is None:
+        geom = geom_fn()
+        _lod_cache.set((key, None), geom, ref=ref)
+    if level is None:
+        return geom
+    simplified = _lod_cache.get((key, level))
+    if simplified is None:
+        simplified = geom.simplify(2.0**level, preserve_topology=True)
+        _lod_cache.set((key, level), simplified, ref=ref)
+    return simplified
+
+
+class SpatialIndex(object):
+    """
+    Spatial index over a collection of shapely geometries backed
+    by an STRtree, allowing the geometries intersecting a bounding
+    box to be looked up without iterating over all of them.
+    """
+
+    def __init__(self, geoms):
+        self.geoms = list(geoms)
+        self._tree = STRtree(self.geoms) if self.geoms else None
+        self._ids = {id(g): i for i, g in enumerate(self.geoms)}
+
+    @classmethod
+    def from_bounds(cls, bounds):
+        """
+        Builds an index over an Nx4 array of (x0, y0, x1, y1) bounds.
+        """
+        return cls([box(*b) for b in bounds])
+
+    def _indices(self, hits):
+        # Shapely>=2 returns indices, older versions the geometries
+        return np.sort(np.array([h if isinstance(h, (int, np.integer))
+                                 else self._ids[id(h)] for h in hits],
+                                dtype=np.int64))
+
+    def query(self, bounds):
+        """
+        Returns the sorted indices of the geometries whose bounding
+        boxes intersect the (x0, y0, x1, y1) bounds.
+        """
+        if self._tree is None:
+            return np.array([], dtype=np.int64)
+        return self._indices(self._tree.query(box(*bounds)))
+
+    def contains(self, x, y):
+        """
+        Returns the sorted indices of the geometries containing or,
+        for lines and points, intersecting the point at x, y.
+        """
+        point = Point(x, y)
+        candidates = self.query((x, y, x, y))
+        mask = np.array([self.geoms[i].intersects(point) for i in candidates],
+                        dtype=bool)
+        return candidates[mask]
+
+    def nearest(self, x, y):
+        """
+        Returns the index of the geometry nearest to the point at
+        x, y or None if the index is empty.
+        """
+        if self._tree is None:
+            return None
+        point = Point(x, y)
+        try:
+            hit = self._tree.nearest(point)
+        except AttributeError:
+            # STRtree.nearest only available in shapely>=1.7
+            return int(np.argmin([g.distance(point) for g in self.geoms]))
+        return int(self._indices([hit])[0])
+
+
+_spatial_index_cache = LRUCache(max_items=32)
+
+
+def spatial_index(obj, geoms_fn):
+    """
+    Returns a SpatialIndex over the geometries returned by geoms_fn,
+    building it on first access and caching it against the supplied
+    object, e.g. the Element the geometries were derived from.
+    """
+    key = id(obj)
+    index = _spatial_index_cache.get(key)
+    if index is None:
+        index = SpatialIndex(geoms_fn())
+        _spatial_index_cache.set(key, index, ref=obj)
+    return index
+
+
+def path_bounds(xs, ys, lengths):
+    """
+    Computes the (x0, y0, x1, y1) bounds of each path stored in flat
+    coordinate buffers with the supplied path lengths.
+    """
+    lengths = np.asarray(lengths)
+    bounds = np.full((len(lengths), 4), np.nan)
+    nonempty = lengths > 0
+    starts = (np.cumsum(lengths)-lengths)[nonempty]
+    if len(starts):
+        bounds[nonempty] = np.column_stack([
+            np.minimum.reduceat(xs, starts), np.minimum.reduceat(ys, starts),
+            np.maximum.reduceat(xs, starts), np.maximum.reduceat(ys, starts)])
+    return bounds
+
+
+_path_index_cache = LRUCache(max_items=64)
+
+
+def path_index(arrays):
+    """
+    Returns the bounds of the paths in a dictionary of flat xs and
+    ys buffers and path lengths, e.g. as returned by feature_arrays,
+    along with a SpatialIndex over them. Both are cached against the
+    xs buffer, which feature_arrays returns unchanged from its cache
+    even though it hands out a new dictionary on every call.
+    """
+    xs = arrays['xs']
+    key = id(xs)
+    cached = _path_index_cache.get(key)
+    if cached is None:
+        bounds = path_bounds(xs, arrays['ys'], arrays['lengths'])
+        valid = np.isfinite(bounds).all(axis=1)
+        bounds[~valid] = 0
+        cached = (bounds, SpatialIndex.from_bounds(bounds))
+        _path_index_cache.set(key, cached, ref=xs)
+    return cached
+
+
+def _clip_line(xs, ys, bounds):
+    """
+    Splits a line into the runs of vertices within the bounds,
+    including the first vertex on either side of each run so that
+    segments crossing the bounds are retained.
+    """
+    x0, y0, x1, y1 = bounds
+    inside = (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+    keep = inside.copy()
+    keep[:-1] |= inside[1:]
+    keep[1:] |= inside[:-1]
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], keep.astype(np.int8), [0]])))
+    return [(xs[s:e], ys[s:e]) for s, e in zip(edges[::2], edges[1::2])
+            if e - s > 1]
+
+
+def _clip_polygon(xs, ys, bounds):
+    """
+    Intersects a polygon path with the bounds, returning the paths
+    of the resulting polygons including their interior rings.
+    """
+    try:
+        poly = Polygon(np.column_stack([xs, ys]))
+        if not poly.is_valid:
+            # Resolves the interior rings of paths from hole_paths
+            poly = poly.buffer(0)
+        clipped = poly.intersection(box(*bounds))
+    except Exception:
+        return [(xs, ys)]
+    parts = getattr(clipped, 'geoms', [clipped])
+    polys = [p for p in parts if p.geom_type == 'Polygon' and not p.is_empty]
+    if not polys:
+        return []
+    xs, ys, offsets = hole_paths(*ring_buffers(polys))
+    return [(xs[s:e], ys[s:e]) for s, e in zip(offsets[:-1], offsets[1:])
+            if e > s]
+
+
+def clip_paths(arrays, bounds):
+    """
+    Returns lists of the xs and ys of the paths in a dictionary of
+    flat coordinate buffers (see feature_arrays) which intersect the
+    (x0, y0, x1, y1) bounds. Candidate paths are looked up using a
+    spatial index, those extending beyond the bounds are clipped.
+    """
+    xs, ys = arrays['xs'], arrays['ys']
+    offsets = np.concatenate([[0], np.cumsum(arrays['lengths'])])
+    path_bbox, index = path_index(arrays)
+    x0, y0, x1, y1 = bounds
+    clip = _clip_line if arrays['lines'] else _clip_polygon
+    clipped_xs, clipped_ys = [], []
+    for i in index.query(bounds):
+        pxs, pys = xs[offsets[i]:offsets[i+1]], ys[offsets[i]:offsets[i+1]]
+        if not len(pxs):
+            continue
+        px0, py0, px1, py1 = path_bbox[i]
+        if px0 >= x0 and px1 <= x1 and py0 >= y0 and py1 <= y1:
+            parts = [(pxs, pys)]
+        else:
+            parts = clip(pxs, pys, bounds)
+        for part_xs, part_ys in parts:
+            clipped_xs.append(part_xs)
+            clipped_ys.append(part_ys)
+    return clipped_xs, clipped_ys
@@ -1,17 +1,37 @@
+from collections import OrderedDict
+
 import param
 import numpy as np
 from cartopy import crs as ccrs
-from cartopy.img_transform import warp_array
+from shapely.geometry import LineString, Polygon
 
+from holoviews.core import NdOverlay, Dimension
 from holoviews.operation import ElementOperation
+from holoviews.streams import RangeXY
+
+try:
+    import dask.array as da
+    import xarray as xr
+except ImportError:
+    da, xr = None, None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
 
-from .element import Image, Shape, Polygons, Path, Points
+from .element import Image, Shape, Shapes, Polygons, Path, Points
+from .cache import LRUCache, data_key, crs_key
+from .geometry import (project_geoms, project_geom, project_coords,
+                       spatial_index)
+from .raster import (regrid_indices, apply_regrid_indices, tiled_warp,
+                     lazy_warp, grid_centers, aggregate_coords)
 from .util import project_extents
 
 class project_shape(ElementOperation):
     """
-    Projects Shape, Polygons and Path Elements from their source
-    coordinate reference system to the supplied projection.
+    Projects Shape, Shapes, Polygons and Path Elements from their
+    source coordinate reference system to the supplied projection.
     """
 
     projection = param.ClassSelector(default=ccrs.GOOGLE_MERCATOR,
@@ -19,14 +39,111 @@ class project_shape(ElementOperation):
                                      instantiate=False, doc="""
         Projection the shape type is projected to.""")
 
-    supported_types = [Shape, Polygons, Path]
+    supported_types = [Shape, Shapes, Polygons, Path]
+
+    def _process_overlay(self, overlay):
+        """
+        Projects all Shapes in an NdOverlay sharing a coordinate
+        reference system in a single pass.
+        """
+        shapes = list(overlay.data.values())
+        if not shapes or not all(isinstance(s, Shape) for s in shapes):
+            return overlay
+        crs = shapes[0].crs
+        if crs is None or any(crs_key(s.crs) != crs_key(crs) for s in shapes):
+            return overlay
+        proj = self.p.projection
+        geoms = project_geoms([s.data for s in shapes], crs, proj)
+        return overlay.clone([(k, s.clone(geom, crs=proj)) for (k, s), geom
+                              in zip(overlay.data.items(), geoms)])
 
     def _process_element(self, element):
-        geom = self.p.projection.project_geometry(element.geom(),
-                                                  element.crs)
+        if element.crs == self.p.projection:
+            return element
+        elif isinstance(element, Shapes):
+            geometry = element.geometry.project(element.crs, self.p.projection)
+            data = OrderedDict(element.data, geometry=geometry)
+            return element.clone(data, crs=self.p.projection)
+        geom = project_geom(element.geom(), element.crs, self.p.projection)
         return element.clone(geom, crs=self.p.projection)
 
     def _process(self, element, key=None):
+        element = element.map(self._process_overlay, [NdOverlay])
+        return element.map(self._process_element, self.supported_types)
+
+
+class spatial_select(ElementOperation):
+    """
+    Selects the Shapes in an NdOverlay, the geometries in a Shapes
+    Element or the paths in a Polygons or Path Element whose bounds
+    intersect the x_range and y_range and which contain or are nearest
+    to the x and y position. Lookups use a spatial index which is
+    built on first use and cached alongside the Element. The parameter
+    names match the RangeXY and Tap streams, allowing shapes outside
+    the viewport or under the cursor to be selected dynamically.
+    """
+
+    x_range = param.NumericTuple(default=None, length=2, doc="""
+        The x-axis range geometries must intersect.""")
+
+    y_range = param.NumericTuple(default=None, length=2, doc="""
+        The y-axis range geometries must intersect.""")
+
+    x = param.Number(default=None, doc="""
+        The x-coordinate of the point to look up.""")
+
+    y = param.Number(default=None, doc="""
+        The y-coordinate of the point to look up.""")
+
+    point_mode = param.ObjectSelector(default='contains',
+                                      objects=['contains', 'nearest'], doc="""
+        Whether to select the geometries containing the point or
+        the geometry nearest to it.""")
+
+    supported_types = [Shapes, Polygons, Path]
+
+    def _geometries(self, element):
+        if isinstance(element, NdOverlay):
+            return [shape.data for shape in element]
+        elif isinstance(element, Shapes):
+            return element.geometry.to_geoms()
+        elif isinstance(element, Polygons):
+            return [Polygon(path) if len(path) > 2 else LineString(path)
+                    for path in element.data]
+        return [LineString(path) for path in element.data]
+
+    def _indices(self, element):
+        index = spatial_index(element, lambda: self._geometries(element))
+        indices = np.arange(len(index.geoms))
+        if self.p.x_range is not None or self.p.y_range is not None:
+            limit = np.finfo(np.float64).max
+            x0, x1 = self.p.x_range or (-limit, limit)
+            y0, y1 = self.p.y_range or (-limit, limit)
+            indices = index.query((x0, y0, x1, y1))
+        if self.p.x is not None and self.p.y is not None:
+            if self.p.point_mode == 'nearest':
+                nearest = index.nearest(self.p.x, self.p.y)
+                hits = np.array([] if nearest is None else [nearest],
+                                dtype=np.int64)
+            else:
+                hits = index.contains(self.p.x, self.p.y)
+            indices = np.intersect1d(indices, hits)
+        return indices
+
+    def _process_overlay(self, overlay):
+        if not len(overlay) or not all(isinstance(s, Shape) for s in overlay):
+            return overlay
+        items = list(overlay.data.items())
+        return overlay.clone([items[i] for i in self._indices(overlay)])
+
+    def _process_element(self, element):
+        indices = self._indices(element)
+        if isinstance(element, Shapes):
+            return element.take(indices)
+        return element.clone([element.data[i] for i in indices])
+
+    def _process(self, element, key=None):
+        element = element.map(self._process_overlay, [NdOverlay])
         return element.map(self._process_element, self.supported_types)
 
 
@@ -37,17 +154,139 @@ class project_points(ElementOperation):
                                      instantiate=False, doc="""
         Projection the shape type is projected to.""")
 
+    chunk_size = param.Integer(default=1000000, bounds=(1, None), doc="""
+        Number of points transformed at once, Points with more
+        points are transformed in chunks on a pool of threads.""")
+
+    threads = param.Integer(default=None, bounds=(1, None), doc="""
+        Number of threads used to transform chunks of points,
+        defaults to the number of CPUs.""")
+
     supported_types = [Points]
 
     def _process_element(self, element):
         xdim, ydim = element.dimensions()[:2]
         xs, ys = (element.dimension_values(i) for i in range(2))
-        coordinates = self.p.projection.transform_points(element.crs, xs, ys)
-        new_data = element.columns()
-        new_data[xdim.name] = coordinates[:, 0]
-        new_data[ydim.name] = coordinates[:, 1]
+        xs, ys = project_coords(xs, ys, element.crs, self.p.projection,
+                                self.p.chunk_size, self.p.threads)
+        # Replace the key dimension columns keeping the datatype of the
+        # data, dictionaries reference the value columns without copying
+        # them, other datatypes not handled here become a dictionary
+        datatype = [element.interface.datatype]+element.datatype
+        if isinstance(element.data, np.ndarray):
+            dtype = np.result_type(element.data.dtype, xs.dtype)
+            new_data = element.data.astype(dtype)
+            new_data[:, 0], new_data[:, 1] = xs, ys
+        elif pd is not None and isinstance(element.data, pd.DataFrame):
+            new_data = element.data.assign(**{xdim.name: xs, ydim.name: ys})
+        else:
+            if isinstance(element.data, dict):
+                new_data = type(element.data)(element.data)
+            else:
+                new_data = OrderedDict((d.name, element.dimension_values(d))
+                                       for d in element.dimensions())
+                datatype = ['dictionary']+element.datatype
+            new_data[xdim.name] = xs
+            new_data[ydim.name] = ys
         return element.clone(new_data, crs=self.p.projection,
-                             datatype=[element.interface.datatype]+element.datatype)
+                             datatype=datatype)
+
+    def _process(self, element, key=None):
+        return element.map(self._process_element, self.supported_types)
+
+
+class aggregate_points(ElementOperation):
+    """
+    Aggregates Points into an Image of fixed width and height in
+    the supplied projection, covering the x_range and y_range or the
+    projected extent of the Points. Chunks of points are projected
+    and binned in one pass, so no projected copy of the Points is
+    created. By default the operation is dynamic and re-aggregates
+    whenever the RangeXY stream is updated, e.g. when zooming.
+    """
+
+    projection = param.ClassSelector(default=ccrs.GOOGLE_MERCATOR,
+                                     class_=ccrs.Projection,
+                                     instantiate=False, doc="""
+        Projection the points are aggregated in.""")
+
+    aggregator = param.ObjectSelector(default='count',
+                                      objects=['count', 'sum', 'mean'], doc="""
+        Whether to count the points in each pixel or compute the
+        sum or mean of the vdim.""")
+
+    vdim = param.String(default=None, doc="""
+        The value dimension to sum or average, defaults to the
+        first value dimension.""")
+
+    x_range = param.NumericTuple(default=None, length=2, doc="""
+        The x-axis range of the aggregate in projected coordinates.""")
+
+    y_range = param.NumericTuple(default=None, length=2, doc="""
+        The y-axis range of the aggregate in projected coordinates.""")
+
+    width = param.Integer(default=400, bounds=(1, None), doc="""
+        The width of the aggregated Image in pixels.""")
+
+    height = param.Integer(default=400, bounds=(1, None), doc="""
+        The height of the aggregated Image in pixels.""")
+
+    chunk_size = param.Integer(default=1000000, bounds=(1, None), doc="""
+        Number of points projected and aggregated at once.""")
+
+    threads = param.Integer(default=None, bounds=(1, None), doc="""
+        Number of threads used to aggregate chunks of points,
+        defaults to the number of CPUs.""")
+
+    dynamic = param.Boolean(default=True, doc="""
+        Whether to re-aggregate the Points when the streams update.""")
+
+    streams = param.List(default=[RangeXY], doc="""
+        List of streams that are applied if dynamic=True.""")
+
+    supported_types = [Points]
+
+    def _bounds(self, element):
+        proj = self.p.projection
+        if self.p.x_range is None or self.p.y_range is None:
+            (x0, x1), (y0, y1) = element.range(0), element.range(1)
+            if not all(np.isfinite(v) for v in (x0, x1, y0, y1)):
+                (x0, x1), (y0, y1) = proj.x_limits, proj.y_limits
+            else:
+                x0, y0, x1, y1 = project_extents((x0, y0, x1, y1), element.crs, proj)
+        if self.p.x_range is not None:
+            x0, x1 = self.p.x_range
+        if self.p.y_range is not None:
+            y0, y1 = self.p.y_range
+        if x0 == x1:
+            x0, x1 = x0-0.5, x1+0.5
+        if y0 == y1:
+            y0, y1 = y0-0.5, y1+0.5
+        return x0, y0, x1, y1
+
+    def _process_element(self, element):
+        bounds = self._bounds(element)
+        xs, ys = (element.dimension_values(i) for i in range(2))
+        weights, vdim = None, Dimension('Count')
+        if self.p.aggregator != 'count':
+            if self.p.vdim is None and not element.vdims:
+                raise ValueError('The %s aggregator requires Points with '
+                                 'a value dimension.' % self.p.aggregator)
+            vdim = element.get_dimension(self.p.vdim or element.vdims[0], strict=True)
+            weights = element.dimension_values(vdim)
+
+        count, total = aggregate_coords(xs, ys, element.crs, self.p.projection,
+                                        bounds, (self.p.height, self.p.width),
+                                        weights, self.p.chunk_size, self.p.threads)
+        if self.p.aggregator == 'count':
+            agg = count
+        elif self.p.aggregator == 'sum':
+            agg = total
+        else:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                agg = np.where(count > 0, total/count, np.nan)
+        return Image(agg[::-1], bounds=bounds, kdims=element.kdims,
+                     vdims=[vdim], crs=self.p.projection)
 
     def _process(self, element, key=None):
         return element.map(self._process_element, self.supported_types)
@@ -66,23 +305,144 @@ class project_image(ElementOperation):
                                      instantiate=False, doc="""
         Projection the image type is projected to.""")
 
+    cache_size = param.Integer(default=256*1024**2, bounds=(0, None), doc="""
+        Maximum number of bytes of projected image data retained in
+        the cache shared by all project_image instances. Projected
+        data is cached by the address of the source data buffer,
+        the source and target coordinate reference systems and the
+        source extents, so re-rendering an unchanged Image does not
+        warp it again. Since the key is the buffer address rather
+        than its contents, modifying the data of an Image in place
+        returns the stale projection; clone the Image with the new
+        data instead. The nearest-neighbour mapping between the
+        source and target grids is cached in the same cache and
+        counts towards the same limit, so a series of Images sharing
+        one grid, e.g. the frames of a HoloMap, only computes the
+        mapping once and regrids each frame with a cheap gather.
+        Setting the size to zero disables caching.""")
+
+    tile_size = param.Integer(default=None, bounds=(1, None), doc="""
+        When set the target grid is split into square tiles of the
+        given size, each of which is regridded from its footprint in
+        the source array on a pool of threads. This bounds the peak
+        memory usage for very large, e.g. memory mapped, arrays.""")
+
+    threads = param.Integer(default=None, bounds=(1, None), doc="""
+        Number of threads used to regrid tiles, defaults to the
+        number of CPUs.""")
+
     supported_types = [Image]
 
+    def _image_array(self, img):
+        """
+        Returns the array of an Image with the first row at the
+        lower y-bound, avoiding a copy where possible.
+        """
+        if isinstance(img.data, np.ndarray) and img.data.ndim == 2:
+            return img.data[::-1]
+        return img.dimension_values(2, flat=False)
+
+    def _lazy_array(self, img):
+        """
+        Returns the dask array backing an xarray based Image with
+        the first row at the lower y-bound, or None if the data is
+        not lazily loaded.
+        """
+        if da is None or not isinstance(img.data, xr.Dataset):
+            return None
+        xdim, ydim = (kd.name for kd in img.kdims)
+        var = img.data[img.vdims[0].name]
+        if not isinstance(var.data, da.Array):
+            return None
+        var = var.transpose(ydim, xdim)
+        xs, ys = var[xdim].values, var[ydim].values
+        arr = var.data
+        if len(xs) > 1 and xs[0] > xs[-1]:
+            arr = arr[:, ::-1]
+        if len(ys) > 1 and ys[0] > ys[-1]:
+            arr = arr[::-1]
+        return arr
+
+    def _process_lazy(self, img, arr, src_ext):
+        """
+        Projects an Image backed by a dask array returning an Image
+        wrapping a lazily evaluated dask array.
+        """
+        proj = self.p.projection
+        x0, x1, y0, y1 = src_ext
+        xn, yn = arr.shape
+        px0, py0, px1, py1 = project_extents((x0, y0, x1, y1), img.crs, proj)
+        projected, extents = lazy_warp(arr, proj, img.crs, (xn, yn), src_ext,
+                                       (px0, px1, py0, py1), self.p.tile_size)
+        ny, nx = projected.shape
+        xdim, ydim = (kd.name for kd in img.kdims)
+        coords = {xdim: grid_centers(extents[0], extents[1], nx),
+                  ydim: grid_centers(extents[2], extents[3], ny)}
+        data = xr.Dataset({img.vdims[0].name: ((ydim, xdim), projected)},
+                          coords=coords)
+        return Image(data, kdims=img.kdims, vdims=img.vdims, crs=proj)
+
+    # Holds both the projected data and the regridding indices, so
+    # they share the cache_size limit
+    _cache = LRUCache()
+
+    def _regrid_indices(self, shape, src_proj, src_ext):
+        """
+        Returns the regridding indices and target bounds for a
+        source grid, reusing previously computed indices for the
+        same grid, coordinate reference systems and extents.
+        """
+        proj = self.p.projection
+        key = ('indices', shape, crs_key(src_proj), crs_key(proj), src_ext)
+        cached = self._cache.get(key) if self.p.cache_size else None
+        if cached is None:
+            x0, x1, y0, y1 = src_ext
+            px0, py0, px1, py1 = project_extents((x0, y0, x1, y1),
+                                                 src_proj, proj)
+            trgt_ext = (px0, px1, py0, py1)
+            xn, yn = shape
+            indices, extents = regrid_indices(shape, src_proj, proj, (xn, yn),
+                                              src_ext, trgt_ext)
+            bounds = (extents[0], extents[2], extents[1], extents[3])
+            cached = (indices, bounds)
+            if self.p.cache_size:
+                self._cache.set(key, cached)
+        return cached
+
     def _process(self, img, key=None):
         proj = self.p.projection
         if proj == img.crs:
             return img
-        arr = img.dimension_values(2, flat=False)
         x0, x1 = img.range(0)
         y0, y1 = img.range(1)
-        xn, yn = arr.shape
-        px0, py0, px1, py1 = project_extents((x0, y0, x1, y1),
-                                             img.crs, proj)
-        src_ext, trgt_ext = (x0, x1, y0, y1), (px0, px1, py0, py1)
-        projected, extents = warp_array(arr, proj, img.crs, (xn, yn),
-                                        src_ext, trgt_ext)
-        bounds = (extents[0], extents[2], extents[1], extents[3])
-        data = np.flipud(projected)
+        src_ext = (x0, x1, y0, y1)
+
+        arr = self._lazy_array(img)
+        if arr is not None:
+            return self._process_lazy(img, arr, src_ext)
+
+        self._cache.resize(max_bytes=self.p.cache_size)
+        cache_key = ('data', data_key(img.data), img.vdims[0].name,
+                     crs_key(img.crs), crs_key(proj), src_ext)
+        cached = self._cache.get(cache_key) if self.p.cache_size else None
+        if cached is None:
+            if self.p.tile_size:
+                arr = self._image_array(img)
+                xn, yn = arr.shape
+                px0, py0, px1, py1 = project_extents((x0, y0, x1, y1),
+                                                     img.crs, proj)
+                projected, extents = tiled_warp(arr, proj, img.crs, (xn, yn),
+                                                src_ext, (px0, px1, py0, py1),
+                                                self.p.tile_size, self.p.threads)
+                bounds = (extents[0], extents[2], extents[1], extents[3])
+            else:
+                arr = img.dimension_values(2, flat=False)
+                indices, bounds = self._regrid_indices(arr.shape, img.crs, src_ext)
+                projected = apply_regrid_indices(arr, indices)
+            cached = (np.flipud(projected), bounds)
+            if self.p.cache_size:
+                self._cache.set(cache_key, cached, ref=img.data)
+        data, bounds = cached
         return Image(data, bounds=bounds, kdims=img.kdims,
                      vdims=img.vdims, crs=proj)
 
@@ -98,6 +458,9 @@ class project(ElementOperation):
         Projection the image type is projected to.""")
 
     def _process(self, element, key=None):
-        element = element.map(project_image, project_image.supported_types)
-        element = element.map(project_shape, project_shape.supported_types)
-        return element.map(project_points, project_points.supported_types)
+        proj = self.p.projection
+        element = element.map(project_image.instance(projection=proj),
+                              project_image.supported_types)
+        element = project_shape(element, projection=proj)
+        return element.map(project_points.instance(projection=proj),
+                           project_points.supported_types)
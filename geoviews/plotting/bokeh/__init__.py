@@ -1,6 +1,3 @@
-import copy
-import itertools
-
 import param
 import numpy as np
 import shapely.geometry
@@ -16,10 +13,15 @@ from holoviews.plotting.bokeh.element import ElementPlot, OverlayPlot as HvOverl
 from holoviews.plotting.bokeh.chart import PointPlot
 from holoviews.plotting.bokeh.path import PolygonPlot, PathPlot
 from holoviews.plotting.bokeh.raster import RasterPlot
+from holoviews.plotting.bokeh.util import expand_batched_style
 
-from ...element import (WMTS, Points, Polygons, Path, Shape, Image,
+from ...element import (WMTS, Points, Polygons, Path, Shape, Shapes, Image,
                         Feature, is_geographic, Text, _Element)
 from ...operation import project_image
+from ...geometry import (project_geom, project_coords, feature_arrays,
+                         clip_paths, feature_scale, lod_geom, simplify_level,
+                         project_geoms, ring_buffers, hole_paths)
+from ...raster import raster_overview
 from ...util import project_extents, geom_to_array
 
 DEFAULT_PROJ = GOOGLE_MERCATOR
@@ -35,6 +37,16 @@ line_types = (shapely.geometry.MultiLineString, shapely.geometry.LineString)
 poly_types = (shapely.geometry.MultiPolygon, shapely.geometry.Polygon)
 
 
+def constant_column(value, length):
+    """
+    Returns a column repeating a constant value. Numeric values are
+    returned as arrays, allowing bokeh to transfer them in binary.
+    """
+    if np.asarray(value).dtype.kind in 'biuf':
+        return np.full(length, value)
+    return [value]*length
+
+
 class GeoPlot(ElementPlot):
     """
     Plotting baseclass for geographic plots with a cartopy projection.
@@ -82,6 +94,45 @@ class GeoPlot(ElementPlot):
         return (np.NaN,)*4 if not extents else extents
 
 
+    def _viewport(self):
+        """
+        Returns the current (x0, y0, x1, y1) viewport of the plot
+        or None if it is not known.
+        """
+        for stream in self.streams:
+            contents = stream.contents
+            if contents.get('x_range') and contents.get('y_range'):
+                (x0, x1), (y0, y1) = contents['x_range'], contents['y_range']
+                break
+        else:
+            plot = self.handles.get('plot')
+            if plot is None:
+                return None
+            x0, x1 = plot.x_range.start, plot.x_range.end
+            y0, y1 = plot.y_range.start, plot.y_range.end
+        viewport = (x0, y0, x1, y1)
+        if any(v is None or not np.isfinite(v) for v in viewport):
+            return None
+        return viewport
+
+
+    def _viewport_dependent(self):
+        """
+        Whether the data returned by get_data depends on the current
+        viewport, requiring it to be recomputed and sent to the
+        browser on every update even if the element is unchanged.
+        """
+        return False
+
+
+    def _update_glyphs(self, element, ranges):
+        if self._viewport_dependent():
+            # Clear the id of the previous frame so static_source is
+            # disabled and the updated data is sent
+            self.handles.pop('previous_id', None)
+        super(GeoPlot, self)._update_glyphs(element, ranges)
+
+
 
 class OverlayPlot(GeoPlot, HvOverlayPlot):
     """
@@ -142,16 +193,33 @@ class GeoPointPlot(GeoPlot, PointPlot):
         if self.static_source: return data, mapping, style
         xdim, ydim = element.dimensions('key', label=True)
         if len(data[xdim]) and element.crs not in [DEFAULT_PROJ, None]:
-            points = DEFAULT_PROJ.transform_points(element.crs, data[xdim],
-                                                   data[ydim])
-            data[xdim] = points[:, 0]
-            data[ydim] = points[:, 1]
+            data[xdim], data[ydim] = project_coords(data[xdim], data[ydim],
+                                                    element.crs, DEFAULT_PROJ)
         return data, mapping, style
 
 
 class GeoRasterPlot(GeoPlot, RasterPlot):
 
+    overview = param.ObjectSelector(default=None,
+                                    objects=[None, 'mean', 'nearest', 'max'], doc="""
+        Reducer used to build a cached multi-resolution overview
+        pyramid of the raster. If enabled only the window of the
+        coarsest level exceeding the screen resolution of the current
+        viewport is projected and sent to the browser.""")
+
+    def _viewport_dependent(self):
+        return bool(self.overview)
+
+    def _overview(self, element):
+        viewport = self._viewport()
+        if viewport is not None and self.geographic and element.crs != DEFAULT_PROJ:
+            viewport = project_extents(viewport, DEFAULT_PROJ, element.crs)
+        return raster_overview(element, viewport, (self.width, self.height),
+                               self.overview)
+
     def get_data(self, element, ranges, style):
+        if self.overview:
+            element = self._overview(element)
         if self.geographic:
             element = project_image(element, projection=DEFAULT_PROJ)
         return RasterPlot.get_data(self, element, ranges, style)
@@ -164,24 +232,65 @@ class GeometryPlot(GeoPlot):
     reference system before creating the glyph.
     """
 
+    precision = param.ObjectSelector(default='float64',
+                                     objects=['float32', 'float64'], doc="""
+        Floating point precision of the coordinates sent to the
+        browser. Single precision halves the size of the data and
+        represents Web Mercator coordinates to within a few meters.""")
+
+    simplify = param.Boolean(default=False, doc="""
+        Whether to simplify the geometries to the resolution of the
+        current viewport, bounding the number of vertices sent to the
+        browser. Simplified geometries are computed once per level of
+        a power of two tolerance pyramid and cached.""")
+
+    def _viewport_dependent(self):
+        return self.simplify
+
+    def _get_geom(self, element):
+        """
+        Returns the geometry of the element projected to the plot
+        projection and, if enabled, simplified to the current pixel
+        size.
+        """
+        def project():
+            geoms = element.geom()
+            if element.crs and element.crs != DEFAULT_PROJ:
+                geoms = project_geom(geoms, element.crs, DEFAULT_PROJ)
+            return geoms
+        if not self.simplify:
+            return project()
+
+        key = (type(element).__name__, id(element))
+        geom = lod_geom(key, project, ref=element)
+        if geom.is_empty:
+            return geom
+        viewport = self._viewport()
+        x0, y0, x1, y1 = geom.bounds if viewport is None else viewport
+        pixel_size = max((x1-x0)/float(self.width), (y1-y0)/float(self.height))
+        return lod_geom(key, project, simplify_level(pixel_size), ref=element)
+
+    @property
+    def _coord_dtype(self):
+        return np.float32 if self.precision == 'float32' else np.float64
+
     def get_data(self, element, ranges, style):
         if not self.geographic:
             return super(GeometryPlot, self).get_data(element, ranges, style)
-        
+
+        xs = []
         if self.static_source:
             data = {}
         else:
-            geoms = element.geom()
-            if element.crs:
-                geoms = DEFAULT_PROJ.project_geometry(geoms, element.crs)
-            xs, ys = geom_to_array(geoms)
+            xs, ys = geom_to_array(self._get_geom(element),
+                                   dtype=self._coord_dtype)
             data = dict(xs=ys, ys=xs) if self.invert_axes else dict(xs=xs, ys=ys)
 
         mapping = dict(self._mapping)
         if element.vdims and getattr(element, 'level', None) is not None:
             cdim = element.vdims[0]
             dim_name = util.dimension_sanitizer(cdim.name)
-            data[dim_name] = [element.level for _ in range(len(xs))]
+            data[dim_name] = constant_column(element.level, len(xs))
             cmapper = self._get_colormapper(cdim, element, ranges, style)
             color_prop = 'fill_color' if isinstance(element, Polygons) else 'line_color'
             mapping[color_prop] = {'field': dim_name, 'transform': cmapper}
@@ -190,8 +299,8 @@ class GeometryPlot(GeoPlot):
             dim_name = util.dimension_sanitizer(element.vdims[0].name)
             for k, v in self.overlay_dims.items():
                 dim = util.dimension_sanitizer(k.name)
-                data[dim] = [v for _ in range(len(xs))]
-            data[dim_name] = [element.level for _ in range(len(xs))]
+                data[dim] = constant_column(v, len(xs))
+            data[dim_name] = constant_column(element.level, len(xs))
 
         self._get_hover_data(data, element)
         return data, mapping, style
@@ -208,16 +317,19 @@ class GeoPathPlot(GeometryPlot, PathPlot):
 class GeoShapePlot(GeoPolygonPlot):
 
     def get_data(self, element, ranges, style):
+        empty, dim, xs = False, None, []
         if self.static_source:
             data = {}
         else:
-            geoms = element.geom()
-            if self.geographic and element.crs != DEFAULT_PROJ:
+            if self.geographic:
                 try:
-                    geoms = DEFAULT_PROJ.project_geometry(geoms, element.crs)
+                    geoms = self._get_geom(element)
                 except:
                     empty = True
-            xs, ys = ([], []) if empty else geom_to_array(geoms)
+            else:
+                geoms = element.geom()
+            xs, ys = ([], []) if empty else geom_to_array(geoms, holes=True,
+                                                          dtype=self._coord_dtype)
             data = dict(xs=xs, ys=ys)
 
         mapping = dict(self._mapping)
@@ -228,44 +340,207 @@ class GeoShapePlot(GeoPolygonPlot):
                 cdim = element.vdims[0]
                 dim_name = util.dimension_sanitizer(cdim.name)
                 cmapper = self._get_colormapper(cdim, element, ranges, style)
-                data[dim_name] = [] if empty else [element.level for _ in range(len(xs))]
+                data[dim_name] = constant_column(element.level, len(xs))
                 mapping['fill_color'] = {'field': dim_name,
                                          'transform': cmapper}
 
         if 'hover' in self.tools+self.default_tools:
             if dim:
                 dim_name = util.dimension_sanitizer(dim)
-                data[dim_name] = [element.level for _ in range(len(xs))]
+                data[dim_name] = constant_column(element.level, len(xs))
             for k, v in self.overlay_dims.items():
                 dim = util.dimension_sanitizer(k.name)
-                data[dim] = [v for _ in range(len(xs))]
+                data[dim] = constant_column(v, len(xs))
+        return data, mapping, style
+
+    def get_batched_data(self, element, ranges=None):
+        """
+        Merges all the Shapes in an NdOverlay into the data for a
+        single patches glyph, projecting and extracting the
+        coordinates of all geometries at once. The levels of the
+        Shapes are mapped through a single color mapper and the
+        overlay keys are added as columns for the hover tool.
+        """
+        shapes = list(element.data.values())
+        mapping = dict(self._mapping)
+        if not shapes:
+            return dict(xs=[], ys=[]), mapping, {}
+        zorders = self._updated_zorders(element)
+        styles = self.lookup_options(element.last, 'style')
+        styles = styles.max_cycles(len(self.ordering))
+        style = dict(styles[zorders[-1]])
+
+        levels = np.array([np.NaN if el.level is None else el.level
+                           for el in shapes], dtype=float)
+        vdims = element.last.vdims
+        cmap = style.get('palette', style.get('cmap', None))
+        color_dim = vdims[0] if (vdims and cmap and not np.isnan(levels).all()) else None
+        if color_dim:
+            cmapper = self._get_colormapper(color_dim, element, ranges, style)
+            mapping['fill_color'] = {'field': util.dimension_sanitizer(color_dim.name),
+                                     'transform': cmapper}
+        if self.static_source:
+            return {}, mapping, style
+
+        if self.geographic:
+            geoms = self._project_geoms(shapes)
+        else:
+            geoms = [el.geom() for el in shapes]
+        buffers = ring_buffers(geoms, return_index=True)
+        xs, ys, offsets = hole_paths(*buffers[:-1])
+        index = buffers[-1]
+        nonempty = np.diff(offsets) > 0
+        offsets = offsets[np.concatenate([[True], nonempty])]
+        index = index[nonempty]
+        dtype = self._coord_dtype
+        split = offsets[1:-1]
+        data = dict(xs=np.split(xs.astype(dtype, copy=False), split),
+                    ys=np.split(ys.astype(dtype, copy=False), split))
+
+        if color_dim:
+            data[util.dimension_sanitizer(color_dim.name)] = levels[index]
+        if 'hover' in self.tools+self.default_tools:
+            if vdims:
+                data[util.dimension_sanitizer(vdims[0].name)] = levels[index]
+            for i, kdim in enumerate(element.kdims):
+                values = np.array([k[i] for k in element.data.keys()])[index]
+                data[util.dimension_sanitizer(kdim.name)] = (
+                    values if values.dtype.kind in 'biuf' else list(values))
+
+        # Expand styles which vary between the Shapes
+        counts = np.bincount(index, minlength=len(shapes))
+        style_mapping = {}
+        for zorder, count in zip(zorders, counts):
+            sdata, smapping = expand_batched_style(styles[zorder], self._batched_style_opts,
+                                                   mapping, count)
+            for k, v in sdata.items():
+                data.setdefault(k, []).extend(v)
+            style_mapping.update(smapping)
+        mapping.update({k: v for k, v in style_mapping.items() if k not in mapping})
+        return data, mapping, style
+
+    def _project_geoms(self, shapes):
+        """
+        Projects the geometries of a list of Shapes to the plot
+        projection, in a single batch if they share a coordinate
+        system and are not simplified. Geometries which cannot be
+        projected are dropped.
+        """
+        crss = [el.crs for el in shapes]
+        if not self.simplify and all(crs == crss[0] for crs in crss):
+            geoms = [el.geom() for el in shapes]
+            if crss[0] == DEFAULT_PROJ:
+                return geoms
+            try:
+                return project_geoms(geoms, crss[0], DEFAULT_PROJ)
+            except:
+                pass
+
+        geoms = []
+        for el in shapes:
+            try:
+                geoms.append(self._get_geom(el))
+            except:
+                geoms.append(shapely.geometry.Polygon())
+        return geoms
+
+
+class GeoShapesPlot(GeoPolygonPlot):
+    """
+    Renders all the geometries in a Shapes Element as a single
+    patches glyph, projecting and extracting the coordinates of all
+    geometries at once.
+    """
+
+    color_index = param.ClassSelector(default=None, class_=(util.basestring, int),
+                                      allow_None=True, doc="""
+        Index or name of the attribute column used to color the
+        geometries.""")
+
+    def get_data(self, element, ranges, style):
+        mapping = dict(self._mapping)
+        cdim = element.get_dimension(self.color_index)
+        if cdim is not None:
+            cmapper = self._get_colormapper(cdim, element, ranges, style)
+            mapping['fill_color'] = {'field': util.dimension_sanitizer(cdim.name),
+                                     'transform': cmapper}
+        if self.static_source:
+            return {}, mapping, style
+
+        geometry = element.geometry
+        if self.geographic and element.crs != DEFAULT_PROJ:
+            geometry = geometry.project(element.crs, DEFAULT_PROJ)
+        xs, ys, offsets, index = geometry.paths()
+        dtype = self._coord_dtype
+        split = offsets[1:-1]
+        data = dict(xs=np.split(xs.astype(dtype, copy=False), split),
+                    ys=np.split(ys.astype(dtype, copy=False), split))
+
+        hover = 'hover' in self.tools+self.default_tools
+        for vdim in element.vdims:
+            if not (hover or vdim == cdim):
+                continue
+            values = element.dimension_values(vdim)[index]
+            data[util.dimension_sanitizer(vdim.name)] = (
+                values if values.dtype.kind in 'biuf' else list(values))
         return data, mapping, style
 
 
 class FeaturePlot(GeoPolygonPlot):
 
     scale = param.ObjectSelector(default='110m',
-                                 objects=['10m', '50m', '110m'],
-                                 doc="The scale of the Feature in meters.")
+                                 objects=['auto', '10m', '50m', '110m'],
+                                 doc="""
+        The scale of the Feature in meters. The 'auto' scale selects
+        the scale from the size of the current viewport and updates
+        it whenever the plot is updated, e.g. by a RangeXY stream.""")
+
+    cache_dir = param.String(default=None, doc="""
+        Directory in which the projected geometries of Natural Earth
+        features are persisted, allowing new processes to skip
+        loading and projecting them. Projected geometries are
+        always cached in memory for the lifetime of the process.""")
+
+    clip = param.Boolean(default=False, doc="""
+        Whether to only send the geometries intersecting the current
+        viewport to the browser, clipping any geometries extending
+        beyond it. The geometries are re-clipped whenever the plot
+        is updated, e.g. by a RangeXY stream.""")
+
+    clip_padding = param.Number(default=0.5, bounds=(0, None), doc="""
+        Padding added around the viewport when clipping geometries,
+        as a fraction of the viewport width and height, avoiding
+        visible edges when panning.""")
+
+    def _viewport_dependent(self):
+        return self.clip or self.scale == 'auto'
 
     def get_data(self, element, ranges, style):
         mapping = dict(self._mapping)
         if self.static_source: return {}, mapping, style
 
-        feature = copy.copy(element.data)
-        feature.scale = self.scale
-        geoms = list(feature.geometries())
-        if isinstance(geoms[0], line_types):
+        viewport = self._viewport() if self._viewport_dependent() else None
+        scale = self.scale
+        if scale == 'auto':
+            scale = feature_scale(viewport, DEFAULT_PROJ)
+        arrays = feature_arrays(element.data, scale, element.crs,
+                                DEFAULT_PROJ, self.cache_dir)
+        if arrays['lines']:
             self._plot_methods = dict(single='multi_line')
         else:
             self._plot_methods = dict(single='patches', batched='patches')
-        geoms = [DEFAULT_PROJ.project_geometry(geom, element.crs)
-                 for geom in geoms]
-        arrays = [geom_to_array(geom) for geom in geoms]
-        xs = [arr[0] for arr in arrays]
-        ys = [arr[1] for arr in arrays]
-        data = dict(xs=list(itertools.chain(*xs)),
-                    ys=list(itertools.chain(*ys)))
+
+        dtype = self._coord_dtype
+        if viewport is None or not self.clip:
+            offsets = np.cumsum(arrays['lengths'])[:-1]
+            data = dict(xs=np.split(arrays['xs'].astype(dtype, copy=False), offsets),
+                        ys=np.split(arrays['ys'].astype(dtype, copy=False), offsets))
+        else:
+            x0, y0, x1, y1 = viewport
+            xpad, ypad = (x1-x0)*self.clip_padding, (y1-y0)*self.clip_padding
+            xs, ys = clip_paths(arrays, (x0-xpad, y0-ypad, x1+xpad, y1+ypad))
+            data = dict(xs=[x.astype(dtype, copy=False) for x in xs],
+                        ys=[y.astype(dtype, copy=False) for y in ys])
         return data, mapping, style
 
 
@@ -290,6 +565,7 @@ Store.register({WMTS: TilePlot,
                 Polygons: GeoPolygonPlot,
                 Path: GeoPathPlot,
                 Shape: GeoShapePlot,
+                Shapes: GeoShapesPlot,
                 Image: GeoRasterPlot,
                 Feature: FeaturePlot,
                 Text: GeoTextPlot,
@@ -307,3 +583,4 @@ options.Feature.Ocean  = Options('style', fill_color='#97b6e1', line_color='#97b
 options.Feature.Lakes  = Options('style', fill_color='#97b6e1', line_color='#97b6e1')
 options.Feature.Rivers = Options('style', line_color='#97b6e1')
 options.Shape = Options('style', line_color='black', fill_color='#30A2DA')
+options.Shapes = Options('style', line_color='black', fill_color='#30A2DA')
@@ -3,6 +3,8 @@ import copy
 import numpy as np
 import param
 from cartopy import crs as ccrs
+from matplotlib.collections import PathCollection
+from matplotlib.path import Path as MPLPath
 
 try:
     from owslib.wmts import WebMapTileService
@@ -24,7 +26,9 @@ from holoviews.plotting.mpl.util import get_raster_array
 
 from ...element import (Image, Points, Feature, WMTS, Tiles, Text,
                         LineContours, FilledContours, is_geographic,
-                        Path, Polygons, Shape, RGB)
+                        Path, Polygons, Shape, Shapes, RGB)
+from ...geometry import AutoScaleFeature, orient_rings
+from ...raster import raster_overview
 from ...util import path_to_geom, polygon_to_geom, project_extents, geo_mesh
 
 
@@ -217,12 +221,25 @@ class GeoImagePlot(GeoPlot, ImagePlot):
     Draws a pcolormesh plot from the data in a Image Element.
     """
 
+    overview = param.ObjectSelector(default=None,
+                                    objects=[None, 'mean', 'nearest', 'max'], doc="""
+        Reducer used to build a cached multi-resolution overview
+        pyramid of the raster. If enabled the coarsest level which
+        still exceeds the resolution of the figure is rendered.""")
+
     style_opts = ['alpha', 'cmap', 'visible', 'filterrad', 'clims', 'norm']
 
+    def _overview(self, element):
+        if not self.overview or 'fig' not in self.handles:
+            return element
+        fig = self.handles['fig']
+        shape = tuple(fig.get_size_inches()*fig.dpi)
+        return raster_overview(element, shape=shape, how=self.overview)
+
     def get_data(self, element, ranges, style):
         self._norm_kwargs(element, ranges, style, element.vdims[0])
         style.pop('interpolation', None)
-        xs, ys, zs = geo_mesh(element)
+        xs, ys, zs = geo_mesh(self._overview(element))
         if self.geographic:
             style['transform'] = element.crs
         return (xs, ys, zs), style, {}
@@ -250,6 +267,7 @@ class GeoRGBPlot(GeoImagePlot):
     def get_data(self, element, ranges, style):
         self._norm_kwargs(element, ranges, style, element.vdims[0])
         style.pop('interpolation', None)
+        element = self._overview(element)
         zs = get_raster_array(element)[::-1]
         l, b, r, t = element.bounds.lbrt()
         style['extent'] = [l, r, b, t]
@@ -348,6 +366,53 @@ class GeoShapePlot(GeometryPlot, PolygonPlot):
             SkipRendering('Shape can only be plotted on geographic plot, '
                           'supply a coordinate reference system.')
 
+
+
+class GeoShapesPlot(GeometryPlot, PolygonPlot):
+    """
+    Draws all the geometries in a Shapes Element.
+    """
+
+    apply_ranges = param.Boolean(default=True)
+
+    color_index = param.ClassSelector(default=None, class_=(util.basestring, int),
+                                      allow_None=True, doc="""
+        Index or name of the attribute column used to color the
+        geometries.""")
+
+    def get_data(self, element, ranges, style):
+        if not self.geographic:
+            raise SkipRendering('Shapes can only be plotted on geographic plot, '
+                                'supply a coordinate reference system.')
+        geometry = element.geometry
+        cdim = element.get_dimension(self.color_index)
+        if cdim is not None:
+            self._norm_kwargs(element, ranges, style, cdim)
+            style['clim'] = style.pop('vmin'), style.pop('vmax')
+            index = np.repeat(np.arange(len(geometry)), np.diff(geometry.geom_offsets))
+            style['array'] = element.dimension_values(cdim)[index]
+        return (geometry, element.crs), style, {}
+
+    def init_artists(self, ax, plot_args, plot_kwargs):
+        """
+        Draws the geometries as a PathCollection containing a
+        compound path for each single part geometry.
+        """
+        geometry, crs = plot_args
+        if crs != ax.projection:
+            geometry = geometry.project(crs, ax.projection)
+        xs, ys = orient_rings(geometry.xs, geometry.ys, geometry.ring_offsets,
+                              geometry.part_offsets, geometry.polys)
+        ring_offsets = geometry.ring_offsets
+        codes = np.full(len(xs), MPLPath.LINETO, dtype=MPLPath.code_type)
+        codes[ring_offsets[:-1][np.diff(ring_offsets) > 0]] = MPLPath.MOVETO
+        vertices = np.column_stack([xs, ys])
+        offsets = ring_offsets[geometry.part_offsets]
+        paths = [MPLPath(vertices[s:e], codes[s:e])
+                 for s, e in zip(offsets[:-1], offsets[1:])]
+        artist = PathCollection(paths, **plot_kwargs)
+        ax.add_collection(artist)
+        return {'artist': artist}
         
 ########################################
 #  Geographic features and annotations #
@@ -360,15 +425,20 @@ class FeaturePlot(GeoPlot):
     """
 
     scale = param.ObjectSelector(default='110m',
-                                 objects=['10m', '50m', '110m'],
-                                 doc="The scale of the Feature in meters.")
+                                 objects=['auto', '10m', '50m', '110m'],
+                                 doc="""
+        The scale of the Feature in meters. The 'auto' scale selects
+        the scale from the extent of the axes each time it is drawn.""")
 
     style_opts = ['alpha', 'facecolor', 'edgecolor', 'linestyle', 'linewidth',
                   'visible']
 
     def get_data(self, element, ranges, style):
-        feature = copy.copy(element.data)
-        feature.scale = self.scale
+        if self.scale == 'auto':
+            feature = AutoScaleFeature(element.data)
+        else:
+            feature = copy.copy(element.data)
+            feature.scale = self.scale
         return (feature,), style, {}
 
     def init_artists(self, ax, plot_args, plot_kwargs):
@@ -484,10 +554,12 @@ Store.register({LineContours: LineContourPlot,
                 Polygons: GeoPolygonPlot,
                 Path: GeoPathPlot,
                 RGB: GeoRGBPlot,
-                Shape: GeoShapePlot}, 'matplotlib')
+                Shape: GeoShapePlot,
+                Shapes: GeoShapesPlot}, 'matplotlib')
 
 
 # Define plot and style options
 options = Store.options(backend='matplotlib')
 
 options.Shape = Options('style', edgecolor='black', facecolor='#30A2DA')
+options.Shapes = Options('style', edgecolor='black', facecolor='#30A2DA')
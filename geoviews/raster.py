@@ -0,0 +1,388 @@
+import threading
+import warnings
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+from cartopy import crs as ccrs
+from cartopy.img_transform import warp_array, regrid
+
+try:
+    import dask.array as da
+    from dask import delayed
+except ImportError:
+    da, delayed = None, None
+
+from .cache import LRUCache, data_key, crs_key
+from .element import RGB
+from .util import project_extents
+
+
+def aggregate_coords(xs, ys, src_proj, dest_proj, bounds, shape,
+                     weights=None, chunk_size=1000000, threads=None):
+    """
+    Projects x- and y-coordinates from the source to the destination
+    projection and bins them into a grid of the supplied (height,
+    width) shape spanning the (x0, y0, x1, y1) bounds in destination
+    coordinates. Chunks of points are projected and binned on a pool
+    of threads so the projected coordinates are never held in memory
+    in full. Returns the number of points in each cell and, if weights
+    are supplied, the sum of the finite weights, with the first row
+    of each grid at y0.
+    """
+    height, width = shape
+    x0, y0, x1, y1 = bounds
+    xscale, yscale = width/float(x1-x0), height/float(y1-y0)
+    count = np.zeros(height*width)
+    total = None if weights is None else np.zeros(height*width)
+    transform = crs_key(src_proj) != crs_key(dest_proj)
+    lock = threading.Lock()
+
+    def aggregate_chunk(start):
+        chunk = slice(start, start+chunk_size)
+        cxs = np.asarray(xs[chunk], dtype=np.float64)
+        cys = np.asarray(ys[chunk], dtype=np.float64)
+        if transform:
+            projected = dest_proj.transform_points(src_proj, cxs, cys)
+            cxs, cys = projected[:, 0], projected[:, 1]
+        with np.errstate(invalid='ignore'):
+            mask = (cxs >= x0) & (cxs <= x1) & (cys >= y0) & (cys <= y1)
+        if weights is not None:
+            cweights = np.asarray(weights[chunk], dtype=np.float64)
+            mask &= np.isfinite(cweights)
+        xi = np.minimum(((cxs[mask]-x0)*xscale).astype(np.int64), width-1)
+        yi = np.minimum(((cys[mask]-y0)*yscale).astype(np.int64), height-1)
+        cells = yi*width + xi
+        ccount = np.bincount(cells, minlength=height*width)
+        ctotal = None
+        if weights is not None:
+            ctotal = np.bincount(cells, cweights[mask], minlength=height*width)
+        with lock:
+            count[:] += ccount
+            if ctotal is not None:
+                total[:] += ctotal
+
+    starts = range(0, len(xs), chunk_size)
+    if len(starts) <= 1:
+        for start in starts:
+            aggregate_chunk(start)
+    else:
+        pool = ThreadPool(threads)
+        try:
+            pool.map(aggregate_chunk, starts)
+        finally:
+            pool.close()
+    count = count.reshape(height, width)
+    return count, None if total is None else total.reshape(height, width)
+
+
+def regrid_indices(shape, src_proj, dest_proj, target_res,
+                   src_ext, trgt_ext):
+    """
+    Computes the nearest-neighbour mapping cartopy's warp_array
+    applies when regridding an array of the supplied shape from
+    the source to the destination projection. Returns an array of
+    flat indices into the source array, masked where a target
+    pixel has no valid source, along with the target extents.
+    Applying the mapping with apply_regrid_indices is equivalent
+    to warping the array but only requires a single gather.
+    """
+    size = int(np.prod(shape))
+    dtype = np.int32 if size < 2**31 else np.int64
+    indices = np.arange(size, dtype=dtype).reshape(shape)
+    return warp_array(indices, dest_proj, src_proj, target_res,
+                      src_ext, trgt_ext)
+
+
+def apply_regrid_indices(arr, indices):
+    """
+    Regrids an array using the flat source indices computed by
+    regrid_indices, masking pixels without a valid source.
+    """
+    mask = np.ma.getmask(indices)
+    regridded = arr.reshape(-1)[np.ma.getdata(indices)]
+    if mask is not np.ma.nomask:
+        mask = mask | np.ma.getmaskarray(regridded)
+        regridded = np.ma.array(regridded, mask=mask)
+    return regridded
+
+
+def grid_centers(lower, upper, n):
+    """
+    Returns n evenly spaced sample points spanning the interval
+    between lower and upper, offset to the centers of the cells,
+    matching the sampling used by cartopy's warp_array.
+    """
+    step = (upper - lower) / float(n)
+    return lower + (np.arange(n) + 0.5) * step
+
+
+def _source_window(footprint, src_proj, src_ext, shape):
+    """
+    Converts a footprint in source coordinates to row and column
+    slices of the source array, padded by one pixel so nearest
+    neighbours on the footprint edges are included.
+    """
+    x0, x1, y0, y1 = src_ext
+    ny, nx = shape
+    fx0, fy0, fx1, fy1 = footprint
+    if isinstance(src_proj, ccrs._CylindricalProjection):
+        # Footprints of cylindrical sources are wrapped into
+        # [-180, 180), shift them into the range of the source
+        period = 360.
+        for shift in (0, period, -period):
+            if x0 <= fx0+shift and fx1+shift <= x1:
+                fx0, fx1 = fx0+shift, fx1+shift
+                break
+        else:
+            fx0, fx1 = x0, x1
+    xstep, ystep = (x1-x0)/float(nx), (y1-y0)/float(ny)
+    c0 = max(int(np.floor((fx0-x0)/xstep))-1, 0)
+    c1 = min(int(np.ceil((fx1-x0)/xstep))+1, nx)
+    r0 = max(int(np.floor((fy0-y0)/ystep))-1, 0)
+    r1 = min(int(np.ceil((fy1-y0)/ystep))+1, ny)
+    return slice(r0, r1), slice(c0, c1)
+
+
+def tile_window(tile_ext, dest_proj, src_proj, src_ext, shape):
+    """
+    Returns row and column slices of the source array covering the
+    footprint of a tile with extents (x0, y0, x1, y1) in the
+    destination projection, or None if the tile has no footprint.
+    """
+    footprint = project_extents(tile_ext, dest_proj, src_proj)
+    # Tiles outside the domain of the projection project to an empty
+    # geometry, which has empty (shapely<2) or NaN (shapely>=2) bounds
+    if len(footprint) != 4 or not np.isfinite(footprint).all():
+        return None
+    rows, cols = _source_window(footprint, src_proj, src_ext, shape)
+    if rows.start >= rows.stop or cols.start >= cols.stop:
+        return None
+    return rows, cols
+
+
+def regrid_window(window, rows, cols, src_proj, src_ext, shape,
+                  dest_proj, xs, ys):
+    """
+    Regrids a window of a source array of the supplied shape onto
+    the target sample points xs and ys, returning a masked array of
+    shape (len(ys), len(xs)).
+    """
+    x0, x1, y0, y1 = src_ext
+    ny, nx = shape
+    src_xs = grid_centers(x0, x1, nx)[cols]
+    src_ys = grid_centers(y0, y1, ny)[rows]
+    src_xs, src_ys = np.meshgrid(src_xs, src_ys)
+    xs, ys = np.meshgrid(xs, ys)
+    return np.ma.asarray(regrid(np.asarray(window), src_xs, src_ys,
+                                src_proj, dest_proj, xs, ys))
+
+
+def warp_tile(arr, src_proj, src_ext, dest_proj, xs, ys, tile_ext):
+    """
+    Regrids the part of a source array covering a tile of the
+    target grid, defined by the target sample points xs and ys and
+    the tile extents (x0, y0, x1, y1) in the destination projection.
+    Only the footprint of the tile in the source array is read.
+    Returns a masked array of shape (len(ys), len(xs)).
+    """
+    window = tile_window(tile_ext, dest_proj, src_proj, src_ext, arr.shape)
+    if window is None:
+        return np.ma.masked_all((len(ys), len(xs)), dtype=arr.dtype)
+    rows, cols = window
+    return regrid_window(arr[rows, cols], rows, cols, src_proj, src_ext,
+                         arr.shape, dest_proj, xs, ys)
+
+
+def tiled_warp(arr, dest_proj, src_proj, target_res, src_ext, trgt_ext,
+               tile_size=512, threads=None):
+    """
+    Equivalent of cartopy's warp_array which splits the target grid
+    into square tiles of the supplied size and regrids each tile
+    from its footprint in the source array using a pool of threads.
+    Peak memory is bounded by the tile size rather than the size of
+    the source array, which may be a memory mapped file.
+    """
+    nx, ny = target_res
+    px0, px1, py0, py1 = trgt_ext
+    xs, ys = grid_centers(px0, px1, nx), grid_centers(py0, py1, ny)
+    xstep, ystep = (px1-px0)/float(nx), (py1-py0)/float(ny)
+
+    data = np.empty((ny, nx), dtype=arr.dtype)
+    mask = np.zeros((ny, nx), dtype=bool)
+    def process_tile(tile):
+        rows, cols = tile
+        tile_ext = (px0+cols.start*xstep, py0+rows.start*ystep,
+                    px0+min(cols.stop, nx)*xstep, py0+min(rows.stop, ny)*ystep)
+        warped = warp_tile(arr, src_proj, src_ext, dest_proj,
+                           xs[cols], ys[rows], tile_ext)
+        data[rows, cols] = warped.data
+        mask[rows, cols] = np.ma.getmaskarray(warped)
+
+    tiles = [(slice(r, r+tile_size), slice(c, c+tile_size))
+             for r in range(0, ny, tile_size)
+             for c in range(0, nx, tile_size)]
+    pool = ThreadPool(threads)
+    try:
+        pool.map(process_tile, tiles)
+    finally:
+        pool.close()
+    data = np.ma.array(data, mask=mask) if mask.any() else data
+    return data, [px0, px1, py0, py1]
+
+
+def _regrid_filled(window, rows, cols, src_proj, src_ext, shape,
+                   dest_proj, xs, ys, dtype):
+    regridded = regrid_window(window, rows, cols, src_proj, src_ext, shape,
+                              dest_proj, xs, ys)
+    return regridded.astype(dtype).filled(np.nan)
+
+
+def lazy_warp(arr, dest_proj, src_proj, target_res, src_ext, trgt_ext,
+              tile_size=None):
+    """
+    Lazy equivalent of tiled_warp for dask arrays. Returns a dask
+    array with one task per tile of the target grid, each of which
+    only depends on the source blocks overlapping the footprint of
+    the tile, so computing a subset of the result only loads the
+    data it requires. Pixels without a valid source are NaN.
+    """
+    nx, ny = target_res
+    px0, px1, py0, py1 = trgt_ext
+    xs, ys = grid_centers(px0, px1, nx), grid_centers(py0, py1, ny)
+    xstep, ystep = (px1-px0)/float(nx), (py1-py0)/float(ny)
+    tile_size = tile_size or max(arr.chunksize)
+    dtype = np.result_type(arr.dtype, np.float32)
+
+    blocks = []
+    for r in range(0, ny, tile_size):
+        row_blocks = []
+        for c in range(0, nx, tile_size):
+            rows, cols = slice(r, min(r+tile_size, ny)), slice(c, min(c+tile_size, nx))
+            shape = (rows.stop-rows.start, cols.stop-cols.start)
+            tile_ext = (px0+cols.start*xstep, py0+rows.start*ystep,
+                        px0+cols.stop*xstep, py0+rows.stop*ystep)
+            window = tile_window(tile_ext, dest_proj, src_proj, src_ext, arr.shape)
+            if window is None:
+                block = da.full(shape, np.nan, dtype=dtype, chunks=shape)
+            else:
+                src_rows, src_cols = window
+                task = delayed(_regrid_filled)(arr[src_rows, src_cols], src_rows,
+                                               src_cols, src_proj, src_ext,
+                                               arr.shape, dest_proj, xs[cols],
+                                               ys[rows], dtype)
+                block = da.from_delayed(task, shape, dtype)
+            row_blocks.append(block)
+        blocks.append(da.concatenate(row_blocks, axis=1))
+    return da.concatenate(blocks, axis=0), [px0, px1, py0, py1]
+
+
+def downsample(array, how='mean'):
+    """
+    Halves the resolution of a 2D array or 3D array of channels by
+    reducing each 2x2 block of cells to its mean, its maximum or its
+    first (nearest) value. The last row or column of arrays with an
+    odd number of rows or columns is replicated to fill the block.
+    """
+    if how == 'nearest':
+        return array[::2, ::2]
+    if isinstance(array, np.ma.MaskedArray):
+        array = array.astype(np.float64).filled(np.nan)
+    h, w = array.shape[:2]
+    if h % 2 or w % 2:
+        pad = [(0, h % 2), (0, w % 2)] + [(0, 0)]*(array.ndim-2)
+        array = np.pad(array, pad, mode='edge')
+    h, w = array.shape[:2]
+    blocks = array.reshape((h//2, 2, w//2, 2) + array.shape[2:])
+    floating = array.dtype.kind == 'f'
+    with warnings.catch_warnings():
+        # Blocks containing only NaNs reduce to NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if how == 'max':
+            return np.nanmax(blocks, axis=(1, 3)) if floating else blocks.max(axis=(1, 3))
+        reduced = np.nanmean(blocks, axis=(1, 3))
+    if not floating:
+        reduced = np.round(reduced).astype(array.dtype)
+    return reduced
+
+
+_overview_cache = LRUCache(max_bytes=512*1024**2)
+
+
+def overview_level(array, level, how='mean', key=None, ref=None):
+    """
+    Returns a level of the overview pyramid of a raster array, where
+    level 0 is the array itself and each subsequent level halves the
+    resolution of the previous one. Levels are computed from the
+    previous level on first access and cached by the supplied key
+    and reference object, defaulting to the memory buffer of the
+    array. Arrays copied from some other data object on every call
+    should therefore be keyed by that object.
+    """
+    if level == 0:
+        return array
+    if key is None:
+        key, ref = data_key(array), array
+    cache_key = (key, how, level)
+    reduced = _overview_cache.get(cache_key)
+    if reduced is None:
+        reduced = downsample(overview_level(array, level-1, how, key, ref), how)
+        _overview_cache.set(cache_key, reduced, ref=ref)
+    return reduced
+
+
+def overview(array, bounds, viewport=None, shape=None, how='mean',
+             key=None, ref=None):
+    """
+    Selects the coarsest level of the overview pyramid of a raster
+    array with (l, b, r, t) bounds, whose first row is at the top,
+    that still exceeds the (width, height) screen resolution over the
+    (x0, y0, x1, y1) viewport. Returns a view of the window of that
+    level covering the viewport and the bounds of the window. The
+    key and ref are used to cache the levels, see overview_level.
+    """
+    l, b, r, t = bounds
+    x0, y0, x1, y1 = bounds if viewport is None else viewport
+    h, w = array.shape[:2]
+    level = 0
+    if shape is not None:
+        width, height = shape
+        density = min(w*(x1-x0)/float((r-l)*width),
+                      h*(y1-y0)/float((t-b)*height))
+        if density >= 2:
+            max_level = int(np.log2(max(min(h, w), 1)))
+            level = min(int(np.log2(density)), max_level)
+
+    reduced = overview_level(array, level, how, key, ref)
+    lh, lw = reduced.shape[:2]
+    cw, ch = (r-l)/float(w)*2**level, (t-b)/float(h)*2**level
+    c0, c1, r0, r1 = 0, lw, 0, lh
+    if viewport is not None:
+        c0 = min(max(int(np.floor((x0-l)/cw)), 0), lw-1)
+        c1 = max(min(int(np.ceil((x1-l)/cw)), lw), c0+1)
+        r0 = min(max(int(np.floor((t-y1)/ch)), 0), lh-1)
+        r1 = max(min(int(np.ceil((t-y0)/ch)), lh), r0+1)
+    window = reduced[r0:r1, c0:c1]
+    return window, (l+c0*cw, t-r1*ch, l+c1*cw, t-r0*ch)
+
+
+def raster_overview(element, viewport=None, shape=None, how='mean'):
+    """
+    Returns a clone of an Image or RGB Element containing only the
+    window of the overview pyramid level matching the (width, height)
+    screen resolution over the (x0, y0, x1, y1) viewport, see overview.
+    The overview levels are cached against the data of the Element.
+    """
+    if element.interface.datatype == 'image':
+        # Avoid copying the channels of memory mapped arrays
+        array = element.data
+    elif isinstance(element, RGB):
+        array = np.dstack([np.flipud(element.dimension_values(d, flat=False))
+                           for d in element.vdims])
+    else:
+        array = np.flipud(element.dimension_values(2, flat=False))
+    key = (data_key(element.data), tuple(d.name for d in element.vdims))
+    window, bounds = overview(array, element.bounds.lbrt(), viewport, shape,
+                              how, key, element.data)
+    if window.shape == array.shape:
+        return element
+    return element.clone(window, bounds=bounds, datatype=['image'])
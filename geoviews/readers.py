@@ -0,0 +1,249 @@
+import os
+import mmap
+import json
+
+import numpy as np
+from cartopy import crs as ccrs
+from shapely.geometry import (MultiLineString, LineString, MultiPolygon,
+                              Polygon, Point, MultiPoint)
+
+try:
+    import shapefile
+except ImportError:
+    shapefile = None
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+from .geometry import _signed_areas
+
+
+# Point, polyline, polygon and multipoint types with optional Z and M
+_SHAPE_TYPES = (1, 3, 5, 8, 11, 13, 15, 18, 21, 23, 25, 28)
+
+
+class ShapeRecord(object):
+    """
+    A record read from a shapefile, holding the shapely geometry and
+    a dictionary of the attributes, matching the interface of the
+    cartopy.io.shapereader.Record objects.
+    """
+
+    def __init__(self, geometry, attributes):
+        self.geometry = geometry
+        self.attributes = attributes
+
+    @property
+    def bounds(self):
+        return self.geometry.bounds
+
+
+def _shapefile_path(path, ext):
+    base = os.path.splitext(path)[0] if path.lower().endswith('.shp') else path
+    for candidate in (base+ext, base+ext.upper()):
+        if os.path.isfile(candidate):
+            return candidate
+    raise IOError('Could not find %s file for shapefile %s' % (ext, path))
+
+
+def _close_reader(reader):
+    """
+    Closes the files held open by a pyshp Reader, which only gained
+    a close method in pyshp 2.0.
+    """
+    if hasattr(reader, 'close'):
+        reader.close()
+        return
+    for f in (reader.shp, reader.shx, reader.dbf):
+        if f is not None:
+            f.close()
+
+
+def shapefile_bounds(path):
+    """
+    Reads the shape type and (x0, y0, x1, y1) bounds of every record
+    in a shapefile from the offsets in the .shx index and the record
+    headers, without parsing any geometries. The bounds of null
+    shapes are NaN.
+    """
+    index = np.fromfile(_shapefile_path(path, '.shx'), dtype='>i4')[25:]
+    offsets = index.reshape(-1, 2)[:, 0].astype(np.int64)*2 + 8
+    if not len(offsets):
+        return np.empty(0, dtype=np.int32), np.empty((0, 4))
+
+    # Gather the shape type followed by the bounding box or point
+    # coordinates, copying them out so the mapping can be closed
+    with open(_shapefile_path(path, '.shp'), 'rb') as f:
+        shp_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            shp = np.frombuffer(shp_map, dtype=np.uint8)
+            indices = np.minimum(offsets[:, None] + np.arange(36), len(shp)-1)
+            header = shp[indices]
+            del shp
+        finally:
+            shp_map.close()
+    types = header[:, :4].view('<i4').ravel()
+    bounds = header[:, 4:].view('<f8').copy()
+    points = (types == 1) | (types == 11) | (types == 21)
+    bounds[points, 2:] = bounds[points, :2]
+    bounds[types == 0] = np.nan
+    return types, bounds
+
+
+def _shape_geometry(shape):
+    """
+    Converts a pyshp Shape to a shapely geometry. Polygon rings are
+    classified into exteriors and holes by their orientation, with
+    holes assigned to the exterior containing them.
+    """
+    stype = shape.shapeType
+    if stype not in _SHAPE_TYPES:
+        raise ValueError('Shapefile shape type %d is not supported.' % stype)
+    points = np.asarray(shape.points, dtype=np.float64).reshape(-1, 2)
+    if stype in (1, 11, 21):
+        return Point(points[0])
+    elif stype in (8, 18, 28):
+        return MultiPoint(points)
+    offsets = np.append(np.asarray(shape.parts, dtype=np.int64), len(points))
+    rings = [points[s:e] for s, e in zip(offsets[:-1], offsets[1:])]
+    if stype in (3, 13, 23):
+        return LineString(rings[0]) if len(rings) == 1 else MultiLineString(rings)
+
+    # Exteriors are clockwise and holes counter-clockwise
+    areas = _signed_areas(points[:, 0], points[:, 1], offsets)
+    exteriors = [[ring, []] for ring, area in zip(rings, areas) if area <= 0]
+    holes = [ring for ring, area in zip(rings, areas) if area > 0]
+    if not exteriors:
+        exteriors, holes = [[ring, []] for ring in holes], []
+    for hole in holes:
+        container = exteriors[-1]
+        for exterior in exteriors:
+            if Polygon(exterior[0]).contains(Point(hole[0])):
+                container = exterior
+                break
+        container[1].append(hole)
+    polys = [Polygon(exterior, interiors) for exterior, interiors in exteriors]
+    return polys[0] if len(polys) == 1 else MultiPolygon(polys)
+
+
+def iter_shapefile(path, bbox=None, predicate=None):
+    """
+    Lazily iterates over the records in a shapefile, yielding a
+    ShapeRecord for each record whose bounding box intersects the
+    (x0, y0, x1, y1) bbox and whose attributes satisfy the predicate,
+    a callable accepting the dictionary of attributes. The bounds
+    are read from the .shx index and record headers, so attributes
+    are only read for records intersecting the bbox and geometries
+    are only parsed for records which are yielded.
+    """
+    if shapefile is None:
+        raise ImportError('Reading shapefiles lazily requires pyshp.')
+    types, bounds = shapefile_bounds(path)
+    # Skip null shapes and unsupported MultiPatch records
+    mask = (types != 0) & (types != 31)
+    if bbox is not None:
+        x0, y0, x1, y1 = bbox
+        mask &= ((bounds[:, 2] >= x0) & (bounds[:, 0] <= x1) &
+                 (bounds[:, 3] >= y0) & (bounds[:, 1] <= y1))
+
+    reader = shapefile.Reader(os.path.splitext(_shapefile_path(path, '.shp'))[0])
+    try:
+        fields = [field[0] for field in reader.fields[1:]]
+        for i in np.flatnonzero(mask):
+            i = int(i)
+            attributes = dict(zip(fields, reader.record(i)))
+            if predicate is not None and not predicate(attributes):
+                continue
+            yield ShapeRecord(_shape_geometry(reader.shape(i)), attributes)
+    finally:
+        _close_reader(reader)
+
+
+def crs_from_epsg(code):
+    """
+    Returns the cartopy coordinate reference system for an EPSG code.
+    """
+    code = int(code)
+    if code == 4326:
+        return ccrs.PlateCarree()
+    elif code in (3857, 3785, 900913):
+        return ccrs.GOOGLE_MERCATOR
+    return ccrs.epsg(code)
+
+
+def _raster_sidecar(path):
+    for candidate in (path+'.json', os.path.splitext(path)[0]+'.json'):
+        if os.path.isfile(candidate):
+            with open(candidate) as f:
+                return json.load(f)
+    return {}
+
+
+def _geotiff_geokey(geokeys, key):
+    # GeoKeyDirectory header is followed by (id, location, count, value)
+    entries = np.asarray(geokeys).reshape(-1, 4)[1:]
+    for key_id, location, _, value in entries:
+        if key_id == key and location == 0:
+            return int(value)
+
+
+def _open_geotiff(path):
+    if tifffile is None:
+        raise ImportError('Reading GeoTIFF files requires tifffile.')
+    with tifffile.TiffFile(path) as tif:
+        tags = {tag.code: tag.value for tag in tif.pages[0].tags.values()}
+    try:
+        array = tifffile.memmap(path, mode='r')
+    except ValueError:
+        # Compressed or non-contiguous data is decoded to a temporary file
+        array = tifffile.imread(path, out='memmap')
+    if array.ndim == 3 and array.shape[0] < min(array.shape[1:]) and array.shape[0] <= 4:
+        array = np.moveaxis(array, 0, -1)
+
+    bounds, crs = None, None
+    if 33550 in tags and 33922 in tags:
+        sx, sy = tags[33550][:2]
+        i, j, _, x, y = tags[33922][:5]
+        l, t = x - i*sx, y + j*sy
+        bounds = (l, t - array.shape[0]*sy, l + array.shape[1]*sx, t)
+    if 34735 in tags:
+        # ProjectedCSTypeGeoKey or GeographicTypeGeoKey
+        code = (_geotiff_geokey(tags[34735], 3072) or
+                _geotiff_geokey(tags[34735], 2048))
+        if code and code != 32767:
+            crs = crs_from_epsg(code)
+    return array, bounds, crs
+
+
+def open_raster(path):
+    """
+    Opens a raster file as a read-only memory mapped array without
+    reading the data, returning the array along with the (l, b, r, t)
+    bounds and cartopy coordinate reference system recorded for it,
+    or None if they are unknown. NPY files, flat binary files and, if
+    tifffile is installed, GeoTIFF files are supported. Flat binary
+    files must be described by a JSON sidecar file, named after the
+    raster with a .json suffix or extension, declaring the dtype and
+    shape and optionally the byte offset, order, bounds and EPSG code
+    of the data. The bounds and EPSG code of NPY files may also be
+    declared in a sidecar.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.tif', '.tiff'):
+        return _open_geotiff(path)
+    meta = _raster_sidecar(path)
+    if ext == '.npy':
+        array = np.load(path, mmap_mode='r')
+    else:
+        if 'dtype' not in meta or 'shape' not in meta:
+            raise ValueError('Flat binary raster %s requires a JSON sidecar '
+                             'declaring its dtype and shape.' % path)
+        array = np.memmap(path, dtype=np.dtype(meta['dtype']), mode='r',
+                          offset=meta.get('offset', 0),
+                          shape=tuple(meta['shape']),
+                          order=meta.get('order', 'C'))
+    bounds = tuple(meta['bounds']) if 'bounds' in meta else None
+    crs = crs_from_epsg(meta['epsg']) if 'epsg' in meta else None
+    return array, bounds, crs
@@ -1,9 +1,10 @@
 import numpy as np
 from cartopy import crs as ccrs
-from shapely.geometry import (MultiLineString, LineString,
-                              MultiPolygon, Polygon)
+from shapely.geometry import MultiLineString, LineString, MultiPolygon, Polygon
 
+from .cache import LRUCache, data_key, crs_key
 from .element import RGB
+from .geometry import geom_buffers, ring_buffers, hole_paths, nan_separated
 
 
 def wrap_lons(lons, base, period):
@@ -14,7 +15,62 @@ def wrap_lons(lons, base, period):
     return ((lons - base + period * 2) % period) + base
 
 
+def wrap_lon_range(x1, x2, base=-180., period=360.):
+    """
+    Computes the exact bounds of the longitude intervals [x1, x2]
+    once wrapped into the range between base and base+period.
+    Intervals spanning a full period or crossing the wrap point
+    cover the whole range. Accepts scalars or arrays of intervals,
+    returning the wrapped lower and upper bounds.
+    """
+    x1 = np.asarray(x1, dtype=np.float64)
+    x2 = np.asarray(x2, dtype=np.float64)
+    lower = wrap_lons(x1, base, period)
+    upper = lower + (x2 - x1)
+    full = ((x2 - x1) >= period) | (upper > base + period)
+    return (np.where(full, base, lower),
+            np.where(full, base + period, upper))
+
+
+_boundary_cache = LRUCache(max_items=64)
+
+_extents_cache = LRUCache(max_items=4096)
+
+
+def boundary_polygon(proj, eroded=False):
+    """
+    Returns the boundary of a projection as a shapely Polygon,
+    optionally eroded by the projection threshold to avoid
+    numerical issues when transforming points on the boundary.
+    Polygons are cached per projection.
+    """
+    key = (crs_key(proj), eroded)
+    poly = _boundary_cache.get(key)
+    if poly is None:
+        poly = Polygon(proj.boundary)
+        if eroded:
+            poly = poly.buffer(-proj.threshold)
+        _boundary_cache.set(key, poly)
+    return poly
+
+
 def project_extents(extents, src_proj, dest_proj, tol=1e-6):
+    """
+    Projects (x0, y0, x1, y1) extents from the source to the
+    destination projection, clipping them to the domain of the
+    source projection. Results are memoized by the extents, rounded
+    to ten significant digits, and the coordinate reference systems.
+    """
+    key = (tuple(float('%.10g' % e) for e in extents),
+           crs_key(src_proj), crs_key(dest_proj), tol)
+    projected = _extents_cache.get(key)
+    if projected is None:
+        projected = _project_extents(extents, src_proj, dest_proj, tol)
+        _extents_cache.set(key, projected)
+    return projected
+
+
+def _project_extents(extents, src_proj, dest_proj, tol=1e-6):
     x1, y1, x2, y2 = extents
 
     # Limit latitudes
@@ -25,8 +81,7 @@ def project_extents(extents, src_proj, dest_proj, tol=1e-6):
     # Wrap longitudes
     cx1, cx2 = src_proj.x_limits
     if isinstance(src_proj, ccrs._CylindricalProjection):
-        lons = wrap_lons(np.linspace(x1, x2, 10000), -180., 360.)
-        x1, x2 = lons.min(), lons.max()
+        x1, x2 = (float(x) for x in wrap_lon_range(x1, x2, -180., 360.))
     else:
         if x1 < cx1: x1 = cx1
         if x2 > cx2: x2 = cx2
@@ -40,15 +95,15 @@ def project_extents(extents, src_proj, dest_proj, tol=1e-6):
     domain_in_src_proj = Polygon([[x1, y1], [x2, y1],
                                   [x2, y2], [x1, y2],
                                   [x1, y1]])
-    boundary_poly = Polygon(src_proj.boundary)
     if src_proj != dest_proj:
         # Erode boundary by threshold to avoid transform issues.
         # This is a workaround for numerical issues at the boundary.
-        eroded_boundary = boundary_poly.buffer(-src_proj.threshold)
+        eroded_boundary = boundary_polygon(src_proj, eroded=True)
         geom_in_src_proj = eroded_boundary.intersection(
             domain_in_src_proj)
         geom_in_crs = dest_proj.project_geometry(geom_in_src_proj, src_proj)
     else:
+        boundary_poly = boundary_polygon(src_proj)
         geom_in_crs = boundary_poly.intersection(domain_in_src_proj)
     return geom_in_crs.bounds
 
@@ -67,36 +122,86 @@ def polygon_to_geom(polygon):
     return MultiPolygon(polys)
 
 
-def geom_to_array(geoms):
-    xs, ys = [], []
-    for geom in geoms:
-        if hasattr(geom, 'exterior'):
-            xs.append(np.array(geom.exterior.coords.xy[0]))
-            ys.append(np.array(geom.exterior.coords.xy[1]))
-        else:
-            geom_data = geom.array_interface()
-            arr = np.array(geom_data['data']).reshape(geom_data['shape'])
-            xs.append(arr[:, 0])
-            ys.append(arr[:, 1])
-    return xs, ys
+def geom_to_array(geoms, nan_sep=False, holes=False, dtype=None):
+    """
+    Converts a collection of geometries to lists of the xs and ys
+    arrays of each path, which are views on contiguous buffers. If
+    nan_sep is enabled the paths are instead joined into a single
+    NaN separated array. If holes is enabled the interior rings of
+    polygons are included in the path of each polygon, see
+    hole_paths. The buffers may be cast to a different dtype, e.g.
+    float32 to reduce the size of the data.
+    """
+    if holes:
+        xs, ys, offsets = hole_paths(*ring_buffers(geoms))
+        offsets = offsets[np.concatenate([[True], np.diff(offsets) > 0])]
+    else:
+        xs, ys, offsets = geom_buffers(geoms)
+    if len(offsets) == 1:
+        return [], []
+    elif dtype is not None:
+        xs, ys = xs.astype(dtype, copy=False), ys.astype(dtype, copy=False)
+    if nan_sep:
+        xs, ys = nan_separated(xs, ys, offsets)
+        return [xs], [ys]
+    split = offsets[1:-1]
+    return np.split(xs, split), np.split(ys, split)
+
+
+def wrap_columns(array):
+    """
+    Returns a copy of a 2D or 3D array with its first column appended
+    after the last one, written into a single preallocated array.
+    Masks of masked arrays are wrapped the same way.
+    """
+    h, w = array.shape[:2]
+    wrapped = np.empty((h, w+1) + array.shape[2:], dtype=array.dtype)
+    wrapped[:, :w] = array
+    wrapped[:, w] = array[:, 0]
+    mask = np.ma.getmask(array)
+    if mask is np.ma.nomask:
+        return wrapped
+    wrapped_mask = np.empty(wrapped.shape, dtype=bool)
+    wrapped_mask[:, :w] = mask
+    wrapped_mask[:, w] = mask[:, 0]
+    return np.ma.MaskedArray(np.ma.getdata(wrapped), wrapped_mask, copy=False)
+
+
+_mesh_cache = LRUCache(max_bytes=256*1024**2)
 
 
 def geo_mesh(element):
     """
     Get mesh data from a 2D Element ensuring that if the data is
     on a cylindrical coordinate system and wraps globally that data
-    actually wraps around.
+    actually wraps around. Coordinates are returned as 1D arrays
+    where the Element defines them that way and the values as a view
+    of the data where possible. Wrapped values are copied once and
+    cached by the data and extent of the Element, so clones of an
+    Element sharing its data reuse the same wrapped copy.
     """
+    lon0, lon1 = element.range(0)
+    wrap = isinstance(element.crs, ccrs._CylindricalProjection) and (lon1 - lon0) == 360
+    if wrap:
+        key = (data_key(element.data), tuple(d.name for d in element.vdims),
+               (lon0, lon1), element.range(1))
+        mesh = _mesh_cache.get(key)
+        if mesh is not None:
+            return mesh
+
+    xs, ys = (element.dimension_values(i, False, False) for i in range(2))
     if isinstance(element, RGB):
-        xs, ys = (element.dimension_values(i, False, False)
-                  for i in range(2))
-        zs = np.dstack([element.dimension_values(i, False, False) for i in range(2, 2+len(element.vdims))])
+        if element.interface.datatype == 'image':
+            zs = np.flipud(element.data)
+        else:
+            zs = np.dstack([element.dimension_values(i, False, False)
+                            for i in range(2, 2+len(element.vdims))])
     else:
-        xs, ys, zs = (element.dimension_values(i, False, False)
-                      for i in range(3))
-    lon0, lon1 = element.range(0)
-    if isinstance(element.crs, ccrs._CylindricalProjection) and (lon1 - lon0) == 360:
-        xs = np.append(xs, xs[0:1] + 360, axis=0)
-        zs = np.ma.concatenate([zs, zs[:, 0:1]], axis=1)
-    return xs, ys, zs
-
+        zs = element.dimension_values(2, False, False)
+    if not wrap:
+        return xs, ys, zs
+
+    xs = np.append(xs, xs[0:1] + 360, axis=0)
+    mesh = (xs, ys, wrap_columns(zs))
+    _mesh_cache.set(key, mesh, ref=element.data)
+    return mesh
@@ -0,0 +1,102 @@
+from unittest import SkipTest
+
+import numpy as np
+from cartopy import crs as ccrs
+from shapely.geometry import MultiPolygon, Point, box
+
+from holoviews import Cycle, DynamicMap, NdOverlay, Store
+from holoviews.streams import RangeXY
+
+from geoviews.element import Shape, Image
+from geoviews.element.comparison import ComparisonTestCase
+
+try:
+    from geoviews.plotting.bokeh import GeoRasterPlot, GeoShapePlot
+    bokeh_renderer = Store.renderers['bokeh']
+except (ImportError, KeyError):
+    bokeh_renderer = None
+
+
+class TestViewportDependentPlots(ComparisonTestCase):
+
+    def setUp(self):
+        if bokeh_renderer is None:
+            raise SkipTest('Bokeh plotting tests require bokeh')
+        self.shape = Shape(Point(0, 0).buffer(10, resolution=2048))
+        self.stream = RangeXY()
+        self.dmap = DynamicMap(lambda x_range, y_range: self.shape,
+                               streams=[self.stream])
+
+    def _vertex_count(self, plot):
+        return sum(len(xs) for xs in plot.handles['source'].data['xs'])
+
+    def test_unchanged_element_resent_for_new_viewport(self):
+        plot = bokeh_renderer.get_plot(self.dmap)
+        plot.simplify = True
+        self.stream.event(x_range=(-2e6, 2e6), y_range=(-2e6, 2e6))
+        zoomed_out = self._vertex_count(plot)
+        self.stream.event(x_range=(0, 1e5), y_range=(1e6, 1.1e6))
+        self.assertFalse(plot.static_source)
+        self.assertTrue(self._vertex_count(plot) > zoomed_out)
+
+    def test_unchanged_element_not_resent_without_viewport_dependence(self):
+        plot = bokeh_renderer.get_plot(self.dmap)
+        count = self._vertex_count(plot)
+        self.stream.event(x_range=(0, 1e5), y_range=(1e6, 1.1e6))
+        self.assertTrue(plot.static_source)
+        self.assertEqual(self._vertex_count(plot), count)
+
+
+class TestRasterOverviewPlot(ComparisonTestCase):
+
+    def setUp(self):
+        if bokeh_renderer is None:
+            raise SkipTest('Bokeh plotting tests require bokeh')
+        self.image = Image(np.random.rand(1024, 1024), bounds=(-10, -10, 10, 10))
+        self.stream = RangeXY()
+        self.dmap = DynamicMap(lambda x_range, y_range: self.image,
+                               streams=[self.stream])
+
+    def _image_shape(self, plot):
+        return plot.handles['source'].data['image'][0].shape
+
+    def test_overview_renders_below_full_resolution(self):
+        plot = GeoRasterPlot(self.image, overview='nearest', renderer=bokeh_renderer)
+        plot.initialize_plot()
+        self.assertTrue(self._image_shape(plot)[1] < 1024)
+
+    def test_overview_window_updates_on_range_change(self):
+        plot = bokeh_renderer.get_plot(self.dmap)
+        plot.overview = 'nearest'
+        self.stream.event(x_range=(-1.1e6, 1.1e6), y_range=(-1.1e6, 1.1e6))
+        zoomed_out = self._image_shape(plot)
+        self.stream.event(x_range=(0, 2e5), y_range=(0, 2e5))
+        self.assertFalse(plot.static_source)
+        self.assertNotEqual(self._image_shape(plot), zoomed_out)
+
+
+class TestBatchedShapePlot(ComparisonTestCase):
+
+    def setUp(self):
+        if bokeh_renderer is None:
+            raise SkipTest('Bokeh plotting tests require bokeh')
+        square = lambda x: box(x, 0, x+1, 1)
+        self.overlay = NdOverlay({0: Shape(square(0)),
+                                  1: Shape(MultiPolygon([square(2), square(4)])),
+                                  2: Shape(square(6))})
+        self.opts = {'NdOverlay': dict(plot=dict(legend_limit=0)),
+                     'Shape': dict(plot=dict(tools=['hover']),
+                                   style=dict(fill_color=Cycle(values=['red', 'blue', 'green'])))}
+
+    def test_batched_shapes_single_patches_source(self):
+        plot = bokeh_renderer.get_plot(self.overlay.opts(self.opts)).subplots[()]
+        self.assertIsInstance(plot, GeoShapePlot)
+        data = plot.handles['source'].data
+        x0s = ccrs.GOOGLE_MERCATOR.transform_points(
+            ccrs.PlateCarree(), np.array([0., 2, 4, 6]), np.zeros(4))[:, 0]
+        self.assertEqual(len(data['xs']), 4)
+        self.assertEqual(np.array([len(xs) for xs in data['xs']]), np.array([5, 5, 5, 5]))
+        self.assertEqual(np.array([xs.min() for xs in data['xs']]), x0s)
+        self.assertEqual(np.array([ys.min() for ys in data['ys']]), np.zeros(4))
+        self.assertEqual(list(data['fill_color']), ['red', 'blue', 'blue', 'green'])
+        self.assertEqual(np.asarray(data['Element']), np.array([0, 1, 1, 2]))
@@ -0,0 +1,32 @@
+import numpy as np
+
+from geoviews.element.comparison import ComparisonTestCase
+from geoviews.cache import LRUCache, data_key
+
+
+class TestLRUCache(ComparisonTestCase):
+
+    def test_lru_cache_evicts_least_recently_used_item(self):
+        cache = LRUCache(max_items=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(sorted(cache._data), ['a', 'c'])
+
+    def test_lru_cache_evicts_by_nbytes(self):
+        cache = LRUCache(max_bytes=120)
+        cache.set('a', np.zeros(10))
+        cache.set('b', np.zeros(10))
+        self.assertEqual(list(cache._data), ['b'])
+        self.assertEqual(cache.nbytes, 80)
+
+    def test_lru_cache_skips_values_larger_than_max_bytes(self):
+        cache = LRUCache(max_bytes=40)
+        cache.set('a', np.zeros(10))
+        self.assertEqual(len(cache), 0)
+
+    def test_data_key_distinguishes_views(self):
+        arr = np.zeros((10, 10))
+        self.assertEqual(data_key(arr), data_key(arr))
+        self.assertNotEqual(data_key(arr), data_key(arr[1:]))
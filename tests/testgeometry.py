@@ -0,0 +1,283 @@
+import numpy as np
+from cartopy import crs as ccrs
+from shapely.geometry import (MultiPolygon, Polygon, Point, LineString,
+                              MultiLineString)
+from cartopy.feature import ShapelyFeature
+
+from geoviews.element.comparison import ComparisonTestCase
+from geoviews.cache import LRUCache, array_nbytes
+from geoviews.geometry import (project_geoms, needs_cutting, clip_paths,
+                               feature_arrays, feature_scale, lod_geom,
+                               simplify_level, geom_buffers, ring_buffers,
+                               hole_paths, GeometryArray, SpatialIndex,
+                               path_index)
+from geoviews.util import geom_to_array
+
+
+def square(x, y):
+    """
+    Unit square with vertices spaced closer than the PlateCarree
+    threshold, so it may be projected without resampling.
+    """
+    return Polygon([(x+i*0.1, y) for i in range(10)] +
+                   [(x+1, y+i*0.1) for i in range(10)] +
+                   [(x+1-i*0.1, y+1) for i in range(10)] +
+                   [(x, y+1-i*0.1) for i in range(10)])
+
+
+def dateline_geoms():
+    """
+    Mixed list of geometries in PlateCarree(central_longitude=180)
+    coordinates, where the second and fourth cross the dateline.
+    """
+    return [square(20, 0), square(-0.5, 10),
+            MultiPolygon([square(40, 5), square(50, 5)]),
+            LineString([(-0.45, 0), (0.05, 1), (0.45, 2)]), square(-60, -20)]
+
+
+class TestProjectGeoms(ComparisonTestCase):
+
+    def setUp(self):
+        self.geoms = [square(0, 0), MultiPolygon([square(10, 10), square(20, 5)])]
+        self.src, self.dest = ccrs.PlateCarree(), ccrs.GOOGLE_MERCATOR
+
+    def test_needs_cutting_dateline(self):
+        bounds = [[-10, -10, 10, 10], [170, 0, 180, 10], [0, 80, 10, 89]]
+        mask = needs_cutting(bounds, self.src, self.dest)
+        self.assertEqual(mask, np.array([False, True, True]))
+
+    def test_project_geoms_matches_project_geometry(self):
+        projected = project_geoms(self.geoms, self.src, self.dest)
+        for geom, proj_geom in zip(self.geoms, projected):
+            expected = self.dest.project_geometry(geom, self.src)
+            self.assertEqual(proj_geom.geom_type, expected.geom_type)
+            self.assertTrue(proj_geom.equals_exact(expected, 1e-6))
+
+    def test_project_geoms_mixed_dateline_crossing(self):
+        src = ccrs.PlateCarree(central_longitude=180)
+        geoms = dateline_geoms()
+        bounds = [geom.bounds for geom in geoms]
+        self.assertEqual(needs_cutting(bounds, src, self.dest),
+                         np.array([False, True, False, True, False]))
+        projected = project_geoms(geoms, src, self.dest)
+        self.assertEqual(len(projected), len(geoms))
+        for geom, proj_geom in zip(geoms, projected):
+            expected = self.dest.project_geometry(geom, src)
+            self.assertEqual(proj_geom.geom_type, expected.geom_type)
+            self.assertTrue(proj_geom.equals_exact(expected, 1e-6))
+        self.assertEqual([len(projected[i].geoms) for i in (1, 3)], [2, 2])
+
+
+class TestClipPaths(ComparisonTestCase):
+
+    def setUp(self):
+        self.arrays = dict(xs=np.array([0., 4, 4, 0, 0, 10, 11, 11, 10, 10]),
+                           ys=np.array([0., 0, 4, 4, 0, 10, 10, 11, 11, 10]),
+                           lengths=np.array([5, 5]), lines=False)
+
+    def test_clip_paths_skips_paths_outside_bounds(self):
+        xs, ys = clip_paths(self.arrays, (-1, -1, 5, 5))
+        self.assertEqual(len(xs), 1)
+        self.assertEqual(xs[0], self.arrays['xs'][:5])
+
+    def test_clip_paths_clips_polygons(self):
+        xs, ys = clip_paths(self.arrays, (1, 1, 2, 2))
+        self.assertEqual(len(xs), 1)
+        self.assertEqual((xs[0].min(), xs[0].max()), (1, 2))
+        self.assertEqual((ys[0].min(), ys[0].max()), (1, 2))
+
+    def test_clip_paths_clips_lines(self):
+        arrays = dict(self.arrays, lines=True)
+        xs, ys = clip_paths(arrays, (3, -1, 5, 1))
+        self.assertEqual(xs, [np.array([0., 4, 4])])
+        self.assertEqual(ys, [np.array([0., 0, 4])])
+
+
+class TestFeatureScale(ComparisonTestCase):
+
+    def test_feature_scale_global_extent(self):
+        x0, x1 = ccrs.GOOGLE_MERCATOR.x_limits
+        extent = (x0, x0, x1, x1)
+        self.assertEqual(feature_scale(extent, ccrs.GOOGLE_MERCATOR), '110m')
+
+    def test_feature_scale_regional_extent(self):
+        self.assertEqual(feature_scale((0, 0, 60, 40), ccrs.PlateCarree()), '50m')
+
+    def test_feature_scale_local_extent(self):
+        self.assertEqual(feature_scale((0, 0, 5, 5), ccrs.PlateCarree()), '10m')
+
+    def test_feature_scale_unknown_extent(self):
+        self.assertEqual(feature_scale(None, ccrs.PlateCarree()), '110m')
+
+
+class TestFeatureArrays(ComparisonTestCase):
+
+    def setUp(self):
+        line = LineString([(0, 0), (10, 10), (20, 0)])
+        self.feature = ShapelyFeature([line], ccrs.PlateCarree())
+
+    def test_feature_arrays_keyed_on_source_projection(self):
+        plate = feature_arrays(self.feature, '110m', ccrs.PlateCarree(),
+                               ccrs.GOOGLE_MERCATOR)
+        mercator = feature_arrays(self.feature, '110m', ccrs.GOOGLE_MERCATOR,
+                                  ccrs.GOOGLE_MERCATOR)
+        self.assertEqual(mercator['xs'], np.array([0, 10, 20], dtype=np.float64))
+        self.assertNotEqual(plate['xs'][1], mercator['xs'][1])
+
+    def test_feature_arrays_cached_arrays_read_only(self):
+        arrays = feature_arrays(self.feature, '110m', ccrs.PlateCarree(),
+                                ccrs.GOOGLE_MERCATOR)
+        self.assertFalse(arrays['xs'].flags.writeable)
+        arrays['xs'] = None
+        cached = feature_arrays(self.feature, '110m', ccrs.PlateCarree(),
+                                ccrs.GOOGLE_MERCATOR)
+        self.assertEqual(len(cached['xs']), 3)
+
+    def test_path_index_cached_across_feature_arrays_calls(self):
+        first = feature_arrays(self.feature, '110m', ccrs.PlateCarree(),
+                               ccrs.GOOGLE_MERCATOR)
+        second = feature_arrays(self.feature, '110m', ccrs.PlateCarree(),
+                                ccrs.GOOGLE_MERCATOR)
+        self.assertIsNot(first, second)
+        self.assertIs(path_index(first), path_index(second))
+
+
+class TestLODGeom(ComparisonTestCase):
+
+    def test_simplify_level(self):
+        self.assertEqual(simplify_level(3.9), 1)
+        self.assertEqual(simplify_level(0), None)
+
+    def test_lod_geom_caches_levels(self):
+        circle = Point(0, 0).buffer(1000, 256)
+        calls = []
+        def geom_fn():
+            calls.append(circle)
+            return circle
+        simplified = lod_geom(('test', id(circle)), geom_fn, 5, ref=circle)
+        self.assertTrue(len(simplified.exterior.coords) < len(circle.exterior.coords))
+        self.assertIs(lod_geom(('test', id(circle)), geom_fn, 5), simplified)
+        self.assertEqual(len(calls), 1)
+
+    def test_lod_cache_bounded_by_coordinate_bytes(self):
+        circle = Point(0, 0).buffer(1000, 256)
+        self.assertEqual(array_nbytes(circle), len(circle.exterior.coords)*16)
+        cache = LRUCache(max_bytes=array_nbytes(circle)*2)
+        for i in range(3):
+            cache.set(i, circle)
+        self.assertEqual(list(cache._data), [1, 2])
+
+
+class TestGeomBuffers(ComparisonTestCase):
+
+    def setUp(self):
+        self.geoms = [Polygon([(0, 0), (1, 0), (1, 1)]),
+                      MultiLineString([[(0, 0), (1, 1)], [(2, 2), (3, 3), (4, 4)]])]
+
+    def test_geom_buffers(self):
+        xs, ys, offsets = geom_buffers(self.geoms)
+        self.assertEqual(xs, np.array([0., 1, 1, 0, 0, 1, 2, 3, 4]))
+        self.assertEqual(ys, np.array([0., 0, 1, 0, 0, 1, 2, 3, 4]))
+        self.assertEqual(offsets, np.array([0, 4, 6, 9]))
+
+    def test_geom_to_array(self):
+        xs, ys = geom_to_array(self.geoms[1])
+        self.assertEqual(xs, [np.array([0., 1]), np.array([2., 3, 4])])
+
+    def test_geom_to_array_nan_separated(self):
+        xs, ys = geom_to_array(self.geoms[1], nan_sep=True)
+        self.assertEqual(xs, [np.array([0., 1, np.NaN, 2, 3, 4])])
+
+    def test_geom_to_array_dtype(self):
+        xs, ys = geom_to_array(self.geoms, dtype=np.float32)
+        self.assertEqual([x.dtype for x in xs], [np.dtype('float32')]*3)
+
+    def test_geom_to_array_empty(self):
+        self.assertEqual(geom_to_array([]), ([], []))
+
+
+class TestHolePaths(ComparisonTestCase):
+
+    def setUp(self):
+        self.poly = Polygon([(0, 0), (0, 4), (4, 4), (4, 0)],
+                            [[(1, 1), (2, 1), (2, 2), (1, 2)]])
+
+    def test_ring_buffers_offsets(self):
+        xs, ys, ring_offsets, part_offsets, polys = ring_buffers(
+            [self.poly, MultiLineString([[(0, 0), (1, 1)]])])
+        self.assertEqual(ring_offsets, np.array([0, 5, 10, 12]))
+        self.assertEqual(part_offsets, np.array([0, 2, 3]))
+        self.assertEqual(polys, np.array([True, False]))
+
+    def test_hole_paths_orients_and_joins_rings(self):
+        xs, ys, offsets = hole_paths(*ring_buffers([self.poly]))
+        self.assertEqual(offsets, np.array([0, 11]))
+        self.assertEqual(xs, np.array([0., 4, 4, 0, 0, 1, 1, 2, 2, 1, 0]))
+        self.assertEqual(ys, np.array([0., 0, 4, 4, 0, 1, 2, 2, 1, 1, 0]))
+
+    def test_geom_to_array_holes(self):
+        xs, ys = geom_to_array(MultiPolygon([self.poly, self.poly]), holes=True)
+        self.assertEqual(len(xs), 2)
+        self.assertEqual(len(xs[1]), 11)
+
+
+class TestGeometryArray(ComparisonTestCase):
+
+    def setUp(self):
+        self.geoms = [Polygon([(0, 0), (0, 4), (4, 4), (4, 0)],
+                              [[(1, 1), (2, 1), (2, 2), (1, 2)]]),
+                      MultiPolygon([Polygon([(10, 10), (11, 10), (11, 11)]),
+                                    Polygon([(20, 5), (21, 5), (21, 6)])]),
+                      Polygon([(5, 5), (6, 5), (6, 6)])]
+        self.array = GeometryArray.from_geoms(self.geoms)
+
+    def test_geometry_array_roundtrip(self):
+        self.assertEqual(len(self.array), 3)
+        for geom, roundtripped in zip(self.geoms, self.array.to_geoms()):
+            self.assertTrue(geom.equals(roundtripped))
+
+    def test_geometry_array_bounds(self):
+        self.assertEqual(self.array.bounds, np.array([[0., 0, 4, 4],
+                                                      [10, 5, 21, 11],
+                                                      [5, 5, 6, 6]]))
+
+    def test_geometry_array_take(self):
+        taken = self.array.take([2, 0])
+        self.assertTrue(taken.geom(0).equals(self.geoms[2]))
+        self.assertTrue(taken.geom(1).equals(self.geoms[0]))
+
+    def test_geometry_array_paths_index(self):
+        xs, ys, offsets, index = self.array.paths()
+        self.assertEqual(index, np.array([0, 1, 1, 2]))
+
+    def test_geometry_array_project_matches_project_geometry(self):
+        src, dest = ccrs.PlateCarree(), ccrs.GOOGLE_MERCATOR
+        projected = self.array.project(src, dest)
+        for geom, proj_geom in zip(self.geoms, projected.to_geoms()):
+            self.assertTrue(proj_geom.equals(dest.project_geometry(geom, src)))
+
+    def test_geometry_array_project_mixed_dateline_crossing(self):
+        src, dest = ccrs.PlateCarree(central_longitude=180), ccrs.GOOGLE_MERCATOR
+        geoms = [g for g in dateline_geoms() if g.geom_type != 'LineString']
+        projected = GeometryArray.from_geoms(geoms).project(src, dest)
+        self.assertEqual(len(projected), len(geoms))
+        for geom, proj_geom in zip(geoms, projected.to_geoms()):
+            self.assertTrue(proj_geom.equals(dest.project_geometry(geom, src)))
+
+
+class TestSpatialIndex(ComparisonTestCase):
+
+    def setUp(self):
+        self.index = SpatialIndex([Polygon([(i, 0), (i+1, 0), (i+1, 1)])
+                                   for i in range(4)])
+
+    def test_spatial_index_query(self):
+        self.assertEqual(self.index.query((2.5, 0, 10, 1)), np.array([2, 3]))
+
+    def test_spatial_index_contains_excludes_bbox_only_hits(self):
+        self.assertEqual(self.index.contains(1.1, 0.9), np.array([], dtype=np.int64))
+        self.assertEqual(self.index.contains(1.9, 0.5), np.array([1]))
+
+    def test_spatial_index_nearest(self):
+        self.assertEqual(self.index.nearest(10, 0), 3)
+        self.assertEqual(SpatialIndex([]).nearest(0, 0), None)
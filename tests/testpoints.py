@@ -0,0 +1,55 @@
+from unittest import SkipTest
+
+import numpy as np
+from cartopy import crs as ccrs
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+from geoviews.element import Points
+from geoviews.element.comparison import ComparisonTestCase
+from geoviews.operation import project_points
+
+
+class TestProjectPoints(ComparisonTestCase):
+
+    def setUp(self):
+        self.xs, self.ys = np.array([0., 10, 20]), np.array([0., 5, 10])
+        self.values = np.array([1., 2, 3])
+        projected = ccrs.GOOGLE_MERCATOR.transform_points(
+            ccrs.PlateCarree(), self.xs, self.ys)
+        self.proj_xs, self.proj_ys = projected[:, 0], projected[:, 1]
+
+    def assert_projected(self, projected):
+        self.assertEqual(projected.crs, ccrs.GOOGLE_MERCATOR)
+        self.assertEqual(projected.dimension_values(0), self.proj_xs)
+        self.assertEqual(projected.dimension_values(1), self.proj_ys)
+        self.assertEqual(projected.dimension_values(2), self.values)
+
+    def test_project_points_dictionary_shares_value_columns(self):
+        points = Points({'x': self.xs, 'y': self.ys, 'z': self.values},
+                        vdims=['z'], datatype=['dictionary'])
+        projected = project_points(points)
+        self.assertEqual(projected.interface.datatype, 'dictionary')
+        self.assertIs(projected.data['z'], points.data['z'])
+        self.assert_projected(projected)
+
+    def test_project_points_dataframe_keeps_datatype(self):
+        if pd is None:
+            raise SkipTest('Test requires pandas')
+        df = pd.DataFrame({'x': self.xs, 'y': self.ys, 'z': self.values})
+        points = Points(df, vdims=['z'], datatype=['dataframe'])
+        projected = project_points(points)
+        self.assertIsInstance(projected.data, pd.DataFrame)
+        self.assert_projected(projected)
+        self.assertEqual(df['x'].values, self.xs)
+
+    def test_project_points_array_keeps_datatype(self):
+        arr = np.column_stack([self.xs, self.ys, self.values])
+        points = Points(arr, vdims=['z'], datatype=['array'])
+        projected = project_points(points)
+        self.assertIsInstance(projected.data, np.ndarray)
+        self.assert_projected(projected)
+        self.assertEqual(arr[:, 0], self.xs)
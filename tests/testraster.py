@@ -0,0 +1,313 @@
+import os
+import json
+import shutil
+import tempfile
+from unittest import SkipTest
+
+import numpy as np
+from cartopy import crs as ccrs
+from cartopy.img_transform import warp_array
+
+try:
+    import dask.array as da
+    from dask import delayed
+except ImportError:
+    da = None
+
+try:
+    import xarray as xr
+except ImportError:
+    xr = None
+
+from geoviews import operation
+from geoviews.element import Image, RGB
+from geoviews.element.comparison import ComparisonTestCase
+from geoviews.operation import project_image
+from geoviews.raster import (raster_overview, regrid_indices,
+                             apply_regrid_indices, tiled_warp, lazy_warp,
+                             aggregate_coords, downsample, overview,
+                             tile_window)
+from geoviews.util import geo_mesh, project_extents
+
+
+class TestRasterOverview(ComparisonTestCase):
+
+    def setUp(self):
+        self.array = np.arange(64.).reshape(8, 8)
+        self.image = Image(self.array, bounds=(0, 0, 8, 8))
+
+    def test_raster_overview_full_resolution_returns_element(self):
+        self.assertIs(raster_overview(self.image, shape=(8, 8)), self.image)
+
+    def test_raster_overview_downsamples_to_screen(self):
+        overview = raster_overview(self.image, shape=(3, 3), how='nearest')
+        self.assertEqual(overview.data, self.array[::2, ::2])
+        self.assertEqual(overview.bounds.lbrt(), (0, 0, 8, 8))
+
+    def test_raster_overview_window(self):
+        overview = raster_overview(self.image, (1, 5, 3, 7), (2, 2))
+        self.assertEqual(overview.data, self.array[1:3, 1:3])
+        self.assertEqual(overview.bounds.lbrt(), (1, 5, 3, 7))
+
+    def test_raster_overview_caches_levels_of_gridded_rgb(self):
+        xs, ys = np.arange(8)+0.5, np.arange(8)+0.5
+        channels = [np.random.rand(8, 8) for _ in range(3)]
+        rgb = RGB((xs, ys)+tuple(channels), datatype=['grid'])
+        first = raster_overview(rgb, shape=(3, 3))
+        second = raster_overview(rgb, shape=(3, 3))
+        self.assertEqual(first.data.shape, (4, 4, 3))
+        self.assertIs(first.data.base, second.data.base)
+
+
+class TestGeoMesh(ComparisonTestCase):
+
+    def setUp(self):
+        self.array = np.random.rand(8, 16)
+        self.image = Image(self.array, bounds=(-180, -90, 180, 90))
+
+    def test_geo_mesh_wraps_global_data(self):
+        xs, ys, zs = geo_mesh(self.image)
+        self.assertEqual(xs[-1], xs[0]+360)
+        self.assertEqual(zs.shape, (8, 17))
+        self.assertEqual(zs[:, -1], zs[:, 0])
+
+    def test_geo_mesh_does_not_wrap_regional_data(self):
+        image = Image(self.array, bounds=(0, 0, 16, 8))
+        self.assertEqual(geo_mesh(image)[2].shape, (8, 16))
+
+    def test_geo_mesh_reused_for_clones_sharing_data(self):
+        self.assertIs(geo_mesh(self.image.clone())[2], geo_mesh(self.image)[2])
+
+    def test_geo_mesh_returns_1d_coordinates(self):
+        xs, ys, zs = geo_mesh(self.image)
+        self.assertEqual((xs.ndim, ys.ndim), (1, 1))
+        self.assertEqual((len(ys), len(xs)), zs.shape)
+
+    def test_geo_mesh_reused_for_overview_clones(self):
+        first = raster_overview(self.image, shape=(8, 4), how='nearest')
+        second = raster_overview(self.image, shape=(8, 4), how='nearest')
+        self.assertIsNot(first, second)
+        self.assertEqual(first.data.shape, (4, 8))
+        self.assertIs(geo_mesh(first)[2], geo_mesh(second)[2])
+
+    def test_geo_mesh_not_reused_across_data(self):
+        other = Image(np.random.rand(8, 16), bounds=(-180, -90, 180, 90))
+        self.assertEqual(geo_mesh(other)[2][:, :16], np.flipud(other.data))
+
+
+class TestProjectImageLazy(ComparisonTestCase):
+
+    def setUp(self):
+        if da is None or xr is None:
+            raise SkipTest('Lazy projection requires dask and xarray')
+        xs, ys = np.linspace(-19.5, 39.5, 60), np.linspace(10.5, 69.5, 60)
+        values = da.from_array(np.random.rand(60, 60), chunks=20)
+        self.dataset = xr.Dataset({'z': (('Latitude', 'Longitude'), values)},
+                                  coords={'Longitude': xs, 'Latitude': ys})
+
+    def _eager_values(self):
+        eager = project_image(Image(self.dataset.compute()), cache_size=0)
+        values = eager.dimension_values(2, flat=False)
+        return np.ma.filled(np.ma.asarray(values, dtype=float), np.nan)
+
+    def test_project_image_lazy_matches_eager(self):
+        lazy = project_image(Image(self.dataset), tile_size=16)
+        self.assertIsInstance(lazy.data, xr.Dataset)
+        self.assertIsInstance(lazy.data['z'].data, da.Array)
+        self.assertEqual(lazy.dimension_values(2, flat=False), self._eager_values())
+
+    def test_project_image_without_dask_projects_eagerly(self):
+        lazy_da = operation.da
+        operation.da = None
+        try:
+            projected = project_image(Image(self.dataset), cache_size=0)
+        finally:
+            operation.da = lazy_da
+        self.assertIsInstance(projected.data, np.ndarray)
+        values = np.ma.filled(np.ma.asarray(projected.dimension_values(2, flat=False),
+                                            dtype=float), np.nan)
+        self.assertEqual(values, self._eager_values())
+
+
+class TestProjectImageCache(ComparisonTestCase):
+
+    def setUp(self):
+        self.image = Image(np.random.rand(30, 45), bounds=(-180, -80, 180, 80))
+        project_image._cache.clear()
+
+    def tearDown(self):
+        project_image._cache.clear()
+
+    def test_project_image_data_and_indices_share_cache_size(self):
+        # Either the projected data or the regridding indices fit
+        # within the limit on their own but not both together
+        project_image(self.image, cache_size=14000)
+        self.assertEqual(len(project_image._cache), 1)
+        self.assertTrue(project_image._cache.nbytes <= 14000)
+
+
+class TestImageFromFile(ComparisonTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'raster.npy')
+        self.array = np.random.rand(4, 6, 3)
+        np.save(self.path, self.array)
+        with open(os.path.join(self.tmpdir, 'raster.json'), 'w') as f:
+            json.dump({'bounds': [0, 0, 6, 4], 'epsg': 4326}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_image_from_file_keeps_memmap(self):
+        image = Image.from_file(self.path)
+        self.assertIsInstance(image.data, np.memmap)
+        self.assertEqual(np.asarray(image.data), self.array[..., 0])
+        self.assertEqual(image.bounds.lbrt(), (0, 0, 6, 4))
+        self.assertIsInstance(image.crs, ccrs.PlateCarree)
+
+    def test_image_from_file_band_bounds_and_crs_overrides(self):
+        image = Image.from_file(self.path, band=2, bounds=(10, 20, 16, 24),
+                                crs=ccrs.GOOGLE_MERCATOR)
+        self.assertIsInstance(image.data, np.memmap)
+        self.assertEqual(np.asarray(image.data), self.array[..., 2])
+        self.assertEqual(image.bounds.lbrt(), (10, 20, 16, 24))
+        self.assertIs(image.crs, ccrs.GOOGLE_MERCATOR)
+
+
+class TestRegridIndices(ComparisonTestCase):
+
+    def test_regrid_indices_match_warp_array(self):
+        arr = np.random.rand(30, 45)
+        src, dest = ccrs.PlateCarree(), ccrs.Orthographic()
+        src_ext = (-180, 180, -80, 80)
+        warped, extents = warp_array(arr, dest, src, (30, 45), src_ext)
+        indices, idx_extents = regrid_indices(arr.shape, src, dest,
+                                              (30, 45), src_ext, None)
+        regridded = apply_regrid_indices(arr, indices)
+        self.assertEqual(idx_extents, extents)
+        self.assertEqual(np.ma.getmaskarray(regridded),
+                         np.ma.getmaskarray(warped))
+        self.assertEqual(regridded.filled(0), warped.filled(0))
+
+
+class TestTiledWarp(ComparisonTestCase):
+
+    def test_tiled_warp_matches_warp_array(self):
+        arr = np.random.rand(60, 90)
+        src, dest = ccrs.PlateCarree(), ccrs.GOOGLE_MERCATOR
+        src_ext = (-20, 40, 10, 70)
+        x0, y0, x1, y1 = project_extents((-20, 10, 40, 70), src, dest)
+        trgt_ext = (x0, x1, y0, y1)
+        warped, extents = warp_array(arr, dest, src, (60, 90),
+                                     src_ext, trgt_ext)
+        tiled, tiled_extents = tiled_warp(arr, dest, src, (60, 90), src_ext,
+                                          trgt_ext, tile_size=16, threads=2)
+        self.assertEqual(tiled_extents, extents)
+        self.assertEqual(np.ma.getmaskarray(tiled), np.ma.getmaskarray(warped))
+        self.assertEqual(np.ma.filled(tiled, 0), np.ma.filled(warped, 0))
+
+    def test_tile_window_outside_domain(self):
+        tile_ext = (6.3e6, 6.3e6, 6.4e6, 6.4e6)
+        self.assertIs(tile_window(tile_ext, ccrs.Orthographic(), ccrs.PlateCarree(),
+                                  (-180, 180, -90, 90), (60, 90)), None)
+
+    def test_tile_window_raises_unexpected_errors(self):
+        with self.assertRaises(ValueError):
+            tile_window((-100, -100, 100, 100), ccrs.Orthographic(),
+                        ccrs.PlateCarree(), (-180, 180, -90, 90), (60,))
+
+
+class TestLazyWarp(ComparisonTestCase):
+
+    def setUp(self):
+        if da is None:
+            raise SkipTest('Lazy warping requires dask')
+        self.arr = np.random.rand(60, 90)
+        self.src, self.dest = ccrs.PlateCarree(), ccrs.GOOGLE_MERCATOR
+        self.src_ext = (-20, 40, 10, 70)
+        x0, y0, x1, y1 = project_extents((-20, 10, 40, 70), self.src, self.dest)
+        self.trgt_ext = (x0, x1, y0, y1)
+
+    def test_lazy_warp_matches_tiled_warp(self):
+        tiled, tiled_extents = tiled_warp(self.arr, self.dest, self.src, (60, 90),
+                                          self.src_ext, self.trgt_ext, tile_size=15)
+        lazy, extents = lazy_warp(da.from_array(self.arr, chunks=(20, 30)),
+                                  self.dest, self.src, (60, 90), self.src_ext,
+                                  self.trgt_ext, tile_size=15)
+        self.assertIsInstance(lazy, da.Array)
+        self.assertEqual(extents, tiled_extents)
+        self.assertEqual(lazy.compute(), np.ma.filled(tiled.astype(float), np.nan))
+
+    def test_lazy_warp_fills_tiles_without_footprint_with_nan(self):
+        x0, x1, y0, y1 = self.trgt_ext
+        trgt_ext = (x0, x1, y0 - (y1-y0), y1)
+        tiled, _ = tiled_warp(self.arr, self.dest, self.src, (60, 90),
+                              self.src_ext, trgt_ext, tile_size=15)
+        lazy, _ = lazy_warp(da.from_array(self.arr, chunks=(20, 30)), self.dest,
+                            self.src, (60, 90), self.src_ext, trgt_ext, tile_size=15)
+        computed = lazy.compute()
+        self.assertTrue(np.isnan(computed[:15]).all())
+        self.assertEqual(computed, np.ma.filled(tiled.astype(float), np.nan))
+
+    def test_lazy_warp_tiles_only_load_overlapping_blocks(self):
+        def fail():
+            raise AssertionError('Block outside tile footprint was loaded')
+        left = da.from_array(self.arr[:, :45], chunks=(60, 45))
+        right = da.from_delayed(delayed(fail)(), (60, 45), self.arr.dtype)
+        arr = da.concatenate([left, right], axis=1)
+        lazy, _ = lazy_warp(arr, self.dest, self.src, (60, 90), self.src_ext,
+                            self.trgt_ext, tile_size=15)
+        tiled, _ = tiled_warp(self.arr, self.dest, self.src, (60, 90),
+                              self.src_ext, self.trgt_ext, tile_size=15)
+        self.assertEqual(lazy[:, :15].compute(),
+                         np.ma.filled(tiled[:, :15].astype(float), np.nan))
+
+
+class TestAggregateCoords(ComparisonTestCase):
+
+    def setUp(self):
+        self.xs = np.array([-170., -10, 10, 20, 170, np.nan])
+        self.ys = np.array([-80., 0, 10, 10, 80, 0])
+        self.bounds = (-2e7, -2e7, 2e7, 2e7)
+
+    def test_aggregate_coords_matches_histogram(self):
+        src, dest = ccrs.PlateCarree(), ccrs.GOOGLE_MERCATOR
+        count, _ = aggregate_coords(self.xs, self.ys, src, dest, self.bounds,
+                                    (4, 4), chunk_size=2)
+        projected = dest.transform_points(src, self.xs, self.ys)
+        expected, _, _ = np.histogram2d(projected[:, 1], projected[:, 0], bins=4,
+                                        range=[(-2e7, 2e7), (-2e7, 2e7)])
+        self.assertEqual(count, expected)
+
+    def test_aggregate_coords_weights_skip_nan(self):
+        proj = ccrs.PlateCarree()
+        weights = np.array([1., 2, np.nan, 4, 5, 6])
+        count, total = aggregate_coords(self.xs, self.ys, proj, proj,
+                                        (-180, -90, 180, 90), (1, 2), weights)
+        self.assertEqual(count, np.array([[2., 2]]))
+        self.assertEqual(total, np.array([[3., 9]]))
+
+
+class TestOverview(ComparisonTestCase):
+
+    def setUp(self):
+        self.array = np.arange(64.).reshape(8, 8)
+
+    def test_downsample_mean_odd_shape(self):
+        self.assertEqual(downsample(np.arange(9.).reshape(3, 3)),
+                         np.array([[2., 3.5], [6.5, 8]]))
+
+    def test_downsample_max_and_nearest(self):
+        self.assertEqual(downsample(self.array, 'max')[0], np.array([9., 11, 13, 15]))
+        self.assertEqual(downsample(self.array, 'nearest')[0], np.array([0., 2, 4, 6]))
+
+    def test_overview_selects_coarsest_level_exceeding_screen(self):
+        window, bounds = overview(self.array, (0, 0, 8, 8), shape=(3, 3))
+        self.assertEqual(window.shape, (4, 4))
+        self.assertEqual(bounds, (0, 0, 8, 8))
+
+    def test_overview_window(self):
+        window, bounds = overview(self.array, (0, 0, 8, 8), (1, 5, 3, 7), (2, 2))
+        self.assertEqual(window, self.array[1:3, 1:3])
+        self.assertEqual(bounds, (1, 5, 3, 7))
@@ -0,0 +1,184 @@
+import os
+import json
+import shutil
+import tempfile
+from unittest import SkipTest
+
+import numpy as np
+import cartopy
+from cartopy import crs as ccrs
+from cartopy.io.shapereader import Reader
+
+try:
+    import shapefile
+except ImportError:
+    shapefile = None
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+from geoviews.element.comparison import ComparisonTestCase
+from geoviews.readers import shapefile_bounds, iter_shapefile, open_raster
+
+
+class TestIterShapefile(ComparisonTestCase):
+
+    def setUp(self):
+        self.path = os.path.join(os.path.dirname(cartopy.__file__), 'tests',
+                                 'lakes_shapefile', 'ne_110m_lakes.shp')
+        if not os.path.isfile(self.path):
+            raise SkipTest('Lakes shapefile not available')
+        self.records = list(Reader(self.path).records())
+
+    def test_shapefile_bounds_match_geometry_bounds(self):
+        types, bounds = shapefile_bounds(self.path)
+        expected = np.array([rec.geometry.bounds for rec in self.records])
+        self.assertEqual(bounds, expected)
+
+    def test_iter_shapefile_matches_reader(self):
+        for rec, lazy in zip(self.records, iter_shapefile(self.path)):
+            self.assertTrue(rec.geometry.equals(lazy.geometry))
+            self.assertEqual(rec.attributes, lazy.attributes)
+
+    def test_iter_shapefile_bbox(self):
+        bounds = self.records[0].geometry.bounds
+        records = list(iter_shapefile(self.path, bbox=bounds))
+        self.assertEqual(len(records), 1)
+        self.assertTrue(records[0].geometry.equals(self.records[0].geometry))
+
+    def test_iter_shapefile_predicate(self):
+        name = self.records[3].attributes['name']
+        records = list(iter_shapefile(self.path, predicate=lambda a: a['name'] == name))
+        self.assertEqual([r.attributes['name'] for r in records], [name])
+
+
+class TestShapefileTypes(ComparisonTestCase):
+
+    def setUp(self):
+        if shapefile is None or not hasattr(shapefile.Writer, 'multipatch'):
+            raise SkipTest('Writing MultiPatch shapefiles requires pyshp>=2')
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'patches')
+        writer = shapefile.Writer(self.path, shapeType=shapefile.MULTIPATCH)
+        writer.field('name', 'C')
+        writer.multipatch([[[0, 0, 0], [2, 0, 0], [2, 3, 1], [0, 3, 1]]],
+                          partTypes=[shapefile.TRIANGLE_STRIP])
+        writer.record('patch')
+        writer.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_shapefile_bounds_multipatch_not_treated_as_point(self):
+        types, bounds = shapefile_bounds(self.path)
+        self.assertEqual(types, np.array([31], dtype=np.int32))
+        self.assertEqual(bounds, np.array([[0, 0, 2, 3]], dtype=np.float64))
+
+    def test_iter_shapefile_skips_multipatch(self):
+        self.assertEqual(list(iter_shapefile(self.path)), [])
+
+    def test_iter_shapefile_closes_reader(self):
+        fd_dir = '/proc/self/fd'
+        if not os.path.isdir(fd_dir):
+            raise SkipTest('Open file descriptors can only be listed on Linux')
+        writer = shapefile.Writer(os.path.join(self.tmpdir, 'points'),
+                                  shapeType=shapefile.POINT)
+        writer.field('name', 'C')
+        for i in range(3):
+            writer.point(i, i)
+            writer.record(str(i))
+        writer.close()
+        n_open = len(os.listdir(fd_dir))
+        records = iter_shapefile(os.path.join(self.tmpdir, 'points'))
+        next(records)
+        records.close()
+        self.assertEqual(len(os.listdir(fd_dir)), n_open)
+
+
+class TestOpenRaster(ComparisonTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.array = np.arange(12, dtype='float32').reshape(3, 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_open_raster_npy_with_sidecar(self):
+        path = os.path.join(self.tmpdir, 'raster.npy')
+        np.save(path, self.array)
+        with open(os.path.join(self.tmpdir, 'raster.json'), 'w') as f:
+            json.dump({'bounds': [0, 0, 4, 3], 'epsg': 4326}, f)
+        array, bounds, crs = open_raster(path)
+        self.assertIsInstance(array, np.memmap)
+        self.assertEqual(np.asarray(array), self.array)
+        self.assertEqual(bounds, (0, 0, 4, 3))
+        self.assertIsInstance(crs, ccrs.PlateCarree)
+
+    def test_open_raster_flat_binary(self):
+        path = os.path.join(self.tmpdir, 'raster.bin')
+        self.array.astype('>i2').tofile(path)
+        with open(path+'.json', 'w') as f:
+            json.dump({'dtype': '>i2', 'shape': [3, 4]}, f)
+        array, bounds, crs = open_raster(path)
+        self.assertIsInstance(array, np.memmap)
+        self.assertEqual(np.asarray(array), self.array.astype('>i2'))
+        self.assertEqual((bounds, crs), (None, None))
+
+    def test_open_raster_flat_binary_without_sidecar(self):
+        path = os.path.join(self.tmpdir, 'raster.bin')
+        self.array.tofile(path)
+        with self.assertRaises(ValueError):
+            open_raster(path)
+
+
+class TestOpenGeoTIFF(ComparisonTestCase):
+
+    def setUp(self):
+        if tifffile is None or not hasattr(tifffile, 'imwrite'):
+            raise SkipTest('Writing GeoTIFF files requires tifffile')
+        self.tmpdir = tempfile.mkdtemp()
+        self.array = np.arange(12, dtype='float32').reshape(3, 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, array, geokey=None, **kwargs):
+        # Pixel (1, 2) is tied to (102, 49) with 2x0.5 unit pixels
+        tags = [(33550, 'd', 3, (2., 0.5, 0.), False),
+                (33922, 'd', 6, (1., 2., 0., 102., 49., 0.), False)]
+        if geokey is not None:
+            tags.append((34735, 'H', 8, (1, 1, 0, 1)+geokey, False))
+        path = os.path.join(self.tmpdir, 'raster.tif')
+        tifffile.imwrite(path, array, extratags=tags, **kwargs)
+        return path
+
+    def test_open_geotiff_bounds_from_pixel_scale_and_tiepoint(self):
+        array, bounds, crs = open_raster(self._write(self.array))
+        self.assertIsInstance(array, np.memmap)
+        self.assertEqual(np.asarray(array), self.array)
+        self.assertEqual(bounds, (100, 48.5, 108, 50))
+        self.assertEqual(crs, None)
+
+    def test_open_geotiff_projected_epsg_geokey(self):
+        path = self._write(self.array, geokey=(3072, 0, 1, 3857))
+        self.assertIs(open_raster(path)[2], ccrs.GOOGLE_MERCATOR)
+
+    def test_open_geotiff_geographic_epsg_geokey(self):
+        path = self._write(self.array, geokey=(2048, 0, 1, 4326))
+        self.assertIsInstance(open_raster(path)[2], ccrs.PlateCarree)
+
+    def test_open_geotiff_planar_bands_interleaved(self):
+        bands = np.random.rand(3, 5, 6).astype('float32')
+        path = self._write(bands, photometric='rgb', planarconfig='separate')
+        array, bounds, _ = open_raster(path)
+        self.assertEqual(np.asarray(array), np.moveaxis(bands, 0, -1))
+        self.assertEqual(bounds, (100, 47.5, 112, 50))
+
+    def test_open_geotiff_compressed_decoded_to_memmap(self):
+        array, bounds, _ = open_raster(self._write(self.array, compression='zlib'))
+        self.assertIsInstance(array, np.memmap)
+        self.assertEqual(np.asarray(array), self.array)
+        self.assertEqual(bounds, (100, 48.5, 108, 50))
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+
+import numpy as np
+from shapely.geometry import Polygon
+
+from holoviews.core import Dataset, NdOverlay
+
+from geoviews.element import Shape, Shapes
+from geoviews.element.comparison import ComparisonTestCase
+from geoviews.operation import spatial_select
+
+
+class Record(object):
+
+    def __init__(self, geometry, attributes):
+        self.geometry = geometry
+        self.attributes = attributes
+
+
+class TestShapeFromRecords(ComparisonTestCase):
+
+    def setUp(self):
+        self.records = [Record(Polygon([(i, 0), (i+1, 0), (i+1, 1)]),
+                               {'code': code, 'name': name})
+                        for i, (code, name) in enumerate([(1, 'a'), (2, 'b'), (3, 'c')])]
+        self.dataset = Dataset({'code': [2, 1, 1, 4], 'value': [20., 10., 11., 40.]},
+                               kdims=['code'], vdims=['value'])
+
+    def test_from_records_merges_first_matching_row(self):
+        overlay = Shape.from_records(self.records, self.dataset, on='code',
+                                     value='value', index='code')
+        self.assertEqual(overlay.keys(), [1, 2, 3])
+        self.assertEqual(np.array([s.level for s in overlay]),
+                         np.array([10., 20., np.NaN]))
+
+    def test_from_records_drop_missing(self):
+        overlay = Shape.from_records(self.records, self.dataset, on='code',
+                                     value='value', index='code',
+                                     drop_missing=True)
+        self.assertEqual(overlay.keys(), [1, 2])
+
+    def test_from_records_index_fallback(self):
+        overlay = Shape.from_records(self.records, self.dataset, on='code',
+                                     value='value', index='missing')
+        self.assertEqual(overlay.kdims[0].name, 'Index')
+        self.assertEqual(list(overlay.data.keys()), [(0, None), (1, None), (2, None)])
+
+
+class TestShapes(ComparisonTestCase):
+
+    def setUp(self):
+        geoms = [Polygon([(i, 0), (i+1, 0), (i+1, 1)]) for i in range(4)]
+        self.shapes = Shapes(OrderedDict([('geometry', geoms),
+                                          ('name', ['a', 'b', 'c', 'd']),
+                                          ('value', np.arange(4.))]))
+
+    def test_shapes_vdims_from_columns(self):
+        self.assertEqual([d.name for d in self.shapes.vdims], ['name', 'value'])
+
+    def test_shapes_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            Shapes({'geometry': self.shapes.geom(), 'value': [1, 2]})
+
+    def test_shapes_select_value(self):
+        selected = self.shapes.select(name='b')
+        self.assertEqual(selected.dimension_values('value'), np.array([1.]))
+
+    def test_shapes_select_range(self):
+        selected = self.shapes.select(value=(1, 3))
+        self.assertEqual(selected.dimension_values('name'), np.array(['b', 'c']))
+
+    def test_shapes_select_bounds(self):
+        selected = self.shapes.select(Longitude=(2.5, 10))
+        self.assertEqual(selected.dimension_values('name'), np.array(['c', 'd']))
+
+    def test_shapes_range(self):
+        self.assertEqual(self.shapes.range('Longitude'), (0, 4))
+        self.assertEqual(self.shapes.range('value'), (0, 3))
+
+
+class TestSpatialSelect(ComparisonTestCase):
+
+    def setUp(self):
+        geoms = [Polygon([(i, 0), (i+1, 0), (i+1, 1)]) for i in range(4)]
+        self.shapes = Shapes(OrderedDict([('geometry', geoms),
+                                          ('name', ['a', 'b', 'c', 'd'])]))
+        self.overlay = NdOverlay({i: Shape(geom) for i, geom in enumerate(geoms)})
+
+    def test_spatial_select_shapes_range(self):
+        selected = spatial_select(self.shapes, x_range=(2.5, 10))
+        self.assertEqual(selected.dimension_values('name'), np.array(['c', 'd']))
+
+    def test_spatial_select_shapes_contains(self):
+        selected = spatial_select(self.shapes, x=1.9, y=0.5)
+        self.assertEqual(selected.dimension_values('name'), np.array(['b']))
+
+    def test_spatial_select_shapes_nearest(self):
+        selected = spatial_select(self.shapes, x=10, y=0, point_mode='nearest')
+        self.assertEqual(selected.dimension_values('name'), np.array(['d']))
+
+    def test_spatial_select_shapes_contains_no_hits(self):
+        selected = spatial_select(self.shapes, x=10, y=10)
+        self.assertEqual(len(selected), 0)
+
+    def test_spatial_select_empty_shapes_nearest(self):
+        shapes = Shapes(OrderedDict([('geometry', []), ('name', [])]))
+        selected = spatial_select(shapes, x=0, y=0, point_mode='nearest')
+        self.assertEqual(len(selected), 0)
+
+    def test_spatial_select_overlay_range(self):
+        selected = spatial_select(self.overlay, x_range=(-1, 1.5), y_range=(0, 1))
+        self.assertEqual(selected.keys(), [0, 1])
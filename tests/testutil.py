@@ -0,0 +1,84 @@
+import numpy as np
+from cartopy import crs as ccrs
+
+from geoviews import util
+from geoviews.element.comparison import ComparisonTestCase
+from geoviews.util import (wrap_lon_range, wrap_columns, boundary_polygon,
+                           project_extents)
+
+
+class TestWrapLonRange(ComparisonTestCase):
+
+    def _wrap(self, x1, x2):
+        return tuple(float(x) for x in wrap_lon_range(x1, x2))
+
+    def test_wrap_lon_range_within_range(self):
+        self.assertEqual(self._wrap(0, 180), (0, 180))
+
+    def test_wrap_lon_range_shifted(self):
+        self.assertEqual(self._wrap(190, 200), (-170, -160))
+
+    def test_wrap_lon_range_crossing_wrap_point(self):
+        self.assertEqual(self._wrap(170, 190), (-180, 180))
+
+    def test_wrap_lon_range_full_period(self):
+        self.assertEqual(self._wrap(0, 360), (-180, 180))
+
+    def test_wrap_lon_range_vectorized(self):
+        lower, upper = wrap_lon_range(np.array([0, 190, 170]),
+                                      np.array([180, 200, 190]))
+        self.assertEqual(lower, np.array([0, -170, -180]))
+        self.assertEqual(upper, np.array([180, -160, 180]))
+
+
+class TestWrapColumns(ComparisonTestCase):
+
+    def test_wrap_columns(self):
+        wrapped = wrap_columns(np.arange(6.).reshape(2, 3))
+        self.assertEqual(wrapped, np.array([[0., 1, 2, 0], [3, 4, 5, 3]]))
+
+    def test_wrap_columns_masked(self):
+        wrapped = wrap_columns(np.ma.masked_equal(np.arange(6.).reshape(2, 3), 3))
+        self.assertEqual(wrapped.mask, np.array([[False, False, False, False],
+                                                 [True, False, False, True]]))
+
+
+class TestProjectionCaches(ComparisonTestCase):
+
+    def setUp(self):
+        self.calls = []
+        self._project_extents = util._project_extents
+        def counted(*args, **kwargs):
+            self.calls.append(args)
+            return self._project_extents(*args, **kwargs)
+        util._project_extents = counted
+        util._extents_cache.clear()
+        util._boundary_cache.clear()
+
+    def tearDown(self):
+        util._project_extents = self._project_extents
+
+    def test_project_extents_repeated_call_hits_cache(self):
+        extents = (-10, -10, 10, 10)
+        first = project_extents(extents, ccrs.PlateCarree(), ccrs.GOOGLE_MERCATOR)
+        second = project_extents(extents, ccrs.PlateCarree(), ccrs.GOOGLE_MERCATOR)
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_project_extents_changed_crs_misses_cache(self):
+        extents = (-10, -10, 10, 10)
+        mercator = project_extents(extents, ccrs.PlateCarree(), ccrs.GOOGLE_MERCATOR)
+        shifted = project_extents(extents, ccrs.PlateCarree(),
+                                  ccrs.Mercator(central_longitude=90))
+        self.assertEqual(len(self.calls), 2)
+        self.assertNotEqual(shifted[0], mercator[0])
+
+    def test_boundary_polygon_repeated_call_hits_cache(self):
+        poly = boundary_polygon(ccrs.Orthographic(), eroded=True)
+        self.assertIs(boundary_polygon(ccrs.Orthographic(), eroded=True), poly)
+
+    def test_boundary_polygon_changed_crs_misses_cache(self):
+        poly = boundary_polygon(ccrs.Mercator())
+        clipped = boundary_polygon(ccrs.Mercator(max_latitude=60))
+        self.assertIsNot(clipped, poly)
+        self.assertTrue(clipped.bounds[3] < poly.bounds[3])